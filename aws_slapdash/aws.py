@@ -3,34 +3,66 @@
 
 import argparse
 import json
-from typing import Dict, Type
+import sys
+from typing import List, TextIO
 
-from aws_slapdash import cloudformation, dynamodb, ec2, ecs, secretsmanager
-from aws_slapdash.configure import load_config, serve_config_command
-from aws_slapdash.utils.command import AWSServiceCommand
+from utils.aws import get_config_path
+from utils.cache import PREFETCH_FLAG, REFRESH_CACHE_FLAG
+from utils.daemon_client import forward_to_daemon
+from utils.services import SERVICE_COMMANDS, load_service_command
+from utils.slapdash import SlapdashMessage, write_message
+from utils.startup import PROFILE_STARTUP_FLAG, profile_startup
+from utils.trace import TRACE_FLAG, invocation, span
 
 
-def server_aws_command():
+def server_aws_command(argv: List[str], out: TextIO):
+    """
+    Serves one command line, writing the view to `out`.
+    The daemon runs several at once, so nothing reads sys.argv or
+    writes to sys.stdout on the way.
+    """
+    with invocation(get_config_path(), argv):
+        try:
+            serve_aws_command(argv, out)
+        except SlapdashMessage as message:
+            write_message(str(message), out)
+
+
+def serve_aws_command(argv: List[str], out: TextIO):
+    with span("import configure"):
+        from aws_slapdash.configure import load_config, serve_config_command
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--service-name",
     )
     parser.add_argument("--configure")
-    args, _ = parser.parse_known_args()
+    parser.add_argument("--search")
+    parser.add_argument("--query")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--refresh")
+    parser.add_argument("--refresh-cache")
+    parser.add_argument("--trace")
+    parser.add_argument("--prefetch")
+    # Background refreshes re-run the command line of the view
+    parser.set_defaults(argv=argv)
+    args, _ = parser.parse_known_args(argv)
 
-    service_name_server_table: Dict[str, Type[AWSServiceCommand]] = {
-        "cloudformation": cloudformation.CloudformationCommand,
-        "dynamodb": dynamodb.DynamoDBCommand,
-        "ec2": ec2.Ec2Command,
-        "ecs": ecs.EcsCommand,
-        "secretsmanager": secretsmanager.SecretsManagerCommand,
-    }
-    config = load_config()
+    with span("load config"):
+        config = load_config()
     if args.service_name:
-        command_server = service_name_server_table[args.service_name](config)
-        command_server.serve_command(parser)
+        with span("import command", service=args.service_name):
+            command_server = load_service_command(args.service_name)(config)
+        if args.prefetch:
+            command_server.prefetch_drilldowns()
+        else:
+            command_server.serve_command(parser, argv, out)
     elif args.configure:
-        serve_config_command(parser)
+        serve_config_command(parser, argv, out)
+    elif args.search:
+        from aws_slapdash.search import serve_search_command
+
+        serve_search_command(parser, config, argv, out)
     else:
         options = [
             {
@@ -42,14 +74,28 @@ def server_aws_command():
                     "value": "true",
                 },
             },
+            {
+                "title": "search all services",
+                "action": {
+                    "type": "add-param",
+                    "name": "search",
+                    "value": "true",
+                },
+                "moveAction": {
+                    "type": "add-param",
+                    "name": "search",
+                    "value": "true",
+                },
+            },
         ]
-        options.extend(
-            [
+        for command_name in SERVICE_COMMANDS:
+            service = load_service_command(command_name)(config)
+            options.append(
                 {
-                    "title": service(config).service_name(),
+                    "title": service.service_name(),
                     "action": {
                         "type": "open-url",
-                        "url": service(config).service_url(),
+                        "url": service.service_url(),
                     },
                     "moveAction": {
                         "type": "add-param",
@@ -57,20 +103,39 @@ def server_aws_command():
                         "value": command_name,
                     },
                 }
-                for command_name, service in service_name_server_table.items()
-            ]
-        )
-        print(
-            json.dumps(
-                {
-                    "view": {
-                        "type": "list",
-                        "options": options,
+            )
+        with span("render", options=len(options)):
+            print(
+                json.dumps(
+                    {
+                        "view": {
+                            "type": "list",
+                            "options": options,
+                        }
                     }
-                }
+                ),
+                file=out,
             )
-        )
+
+
+def main():
+    if PROFILE_STARTUP_FLAG in sys.argv:
+        options = profile_startup(sys.argv)
+        print(json.dumps({"view": {"type": "list", "options": options}}))
+        return
+    # Background refreshes and prefetches run in process so they never block
+    # the daemon, traced commands so the timings are printed to this stderr
+    output = None
+    if not any(
+        flag in sys.argv
+        for flag in (REFRESH_CACHE_FLAG, PREFETCH_FLAG, TRACE_FLAG)
+    ):
+        output = forward_to_daemon(get_config_path(), sys.argv[1:])
+    if output is None:
+        server_aws_command(sys.argv[1:], sys.stdout)
+    else:
+        sys.stdout.write(output)
 
 
 if __name__ == "__main__":
-    server_aws_command()
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+
+# Modules of this package import each other the same way aws.py does
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="aws-slapdash")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "daemon",
+        help="keep AWS sessions warm and serve aws.py over a socket",
+    )
+    subparsers.add_parser(
+        "sync",
+        help="refresh the cached listings that are due, e.g. from cron",
+    )
+    trace_summary = subparsers.add_parser(
+        "trace-summary",
+        help="report p50/p95 timings per view over recent invocations",
+    )
+    trace_summary.add_argument(
+        "--last",
+        type=int,
+        default=1000,
+        help="number of recent invocations to summarize",
+    )
+    args = parser.parse_args()
+    if args.command == "daemon":
+        from daemon import serve_daemon
+
+        serve_daemon()
+    elif args.command == "sync":
+        from utils.aws import load_config
+        from utils.sync import format_result, sync_due
+
+        results = sync_due(load_config())
+        for result in results:
+            print(format_result(result))
+        if any(result.error is not None for result in results):
+            sys.exit(1)
+    elif args.command == "trace-summary":
+        from utils.aws import get_config_path
+        from utils.trace import format_summary, load_entries, summarize
+
+        print(
+            format_summary(
+                summarize(load_entries(get_config_path(), args.last))
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
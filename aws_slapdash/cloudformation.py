@@ -1,12 +1,88 @@
 import argparse
-import json
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, TextIO
 
-from utils.aws import create_session
+from utils.aws import Config, create_client, get_config_path
+from utils.cache import ViewCache
 from utils.command import AWSServiceCommand
-from utils.slapdash import Actions
+from utils.jsonfile import read_json, write_json
+from utils.paginate import paginate
+from utils.slapdash import Actions, write_list_view
+from utils.trace import in_current_context
+
+if TYPE_CHECKING:
+    from utils.tagging import TaggedResource
+
+# Every status except DELETE_COMPLETE, deleted stacks are listed for 90 days
+ACTIVE_STACK_STATUSES = [
+    "CREATE_IN_PROGRESS",
+    "CREATE_FAILED",
+    "CREATE_COMPLETE",
+    "ROLLBACK_IN_PROGRESS",
+    "ROLLBACK_FAILED",
+    "ROLLBACK_COMPLETE",
+    "DELETE_IN_PROGRESS",
+    "DELETE_FAILED",
+    "UPDATE_IN_PROGRESS",
+    "UPDATE_COMPLETE_CLEANUP_IN_PROGRESS",
+    "UPDATE_COMPLETE",
+    "UPDATE_FAILED",
+    "UPDATE_ROLLBACK_IN_PROGRESS",
+    "UPDATE_ROLLBACK_FAILED",
+    "UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS",
+    "UPDATE_ROLLBACK_COMPLETE",
+    "REVIEW_IN_PROGRESS",
+    "IMPORT_IN_PROGRESS",
+    "IMPORT_COMPLETE",
+    "IMPORT_ROLLBACK_IN_PROGRESS",
+    "IMPORT_ROLLBACK_FAILED",
+    "IMPORT_ROLLBACK_COMPLETE",
+]
+RECENT_EVENTS = 10
+
+
+def stack_version(stack: dict) -> str:
+    """
+    Changes whenever the stack is updated or changes status.
+    """
+    last_updated = stack.get("LastUpdatedTime") or stack["CreationTime"]
+    return f"{stack['StackStatus']}|{last_updated}"
+
+
+def stack_view(stack_id: str) -> str:
+    return f"stack:{stack_id}"
+
+
+class StackIndex:
+    """
+    Versions of the active stacks of one profile and region,
+    as of the last listing.
+    """
+
+    def __init__(self, config: Config):
+        target = f"{config.aws_profile}|{config.region}"
+        digest = hashlib.sha256(target.encode()).hexdigest()
+        self.path = os.path.join(
+            get_config_path(), "cloudformation", f"{digest}.json"
+        )
+
+    def load(self) -> Dict[str, str]:
+        return read_json(self.path, {})
+
+    def store(self, versions: Dict[str, str]):
+        write_json(self.path, versions)
+
+    def version(self, stack_id: str) -> Optional[str]:
+        return self.load().get(stack_id)
 
 
 class CloudformationCommand(AWSServiceCommand):
+    service_id = "cloudformation"
+    inventory_view = "stacks"
+    drilldown_param = "stack-id"
+
     def service_name(self):
         return "Cloud Formation"
 
@@ -16,62 +92,170 @@ class CloudformationCommand(AWSServiceCommand):
             + f"cloudformation/home?region={self.config.region}#/stacks/"
         )
 
-    def serve_command(self, arg_parser: argparse.ArgumentParser):
+    def serve_command(
+        self, arg_parser: argparse.ArgumentParser, argv: List[str], out: TextIO
+    ):
         arg_parser.add_argument(
             "--stack-id",
         )
-        args = arg_parser.parse_args()
-        print(
-            json.dumps(
-                {
-                    "view": {
-                        "type": "list",
-                        "options": self.serve_cloudformation(args.stack_id),
-                    }
-                }
+        args = arg_parser.parse_args(argv)
+        write_list_view(self.serve_cloudformation(args), out)
+
+    def serve_cloudformation(self, args: argparse.Namespace):
+        if not args.stack_id:
+            return self.cached_options(
+                args,
+                self.inventory_view,
+                lambda: self.fan_out_options(
+                    lambda command: command.inventory_options()
+                ),
             )
+        self.record_selection(args, args.stack_id)
+        command, stack_id = self.split_target(args.stack_id)
+        return command.cached_stack_details(stack_id, bool(args.refresh))
+
+    def drilldown_cached(self, resource: str) -> bool:
+        version = StackIndex(self.config).version(resource)
+        entry = ViewCache(self.config, self.service_id).load(
+            stack_view(resource)
+        )
+        return (
+            version is not None
+            and entry is not None
+            and entry.version == version
         )
 
-    def serve_cloudformation(self, stack_name):
-        if not stack_name:
-            return self.list_stacks()
+    def prefetch_drilldown(self, resource: str):
+        for _ in self.cached_stack_details(resource, False):
+            pass
 
-    def list_stacks(self):
-        STACK_DETAILS_URL = (
+    def stack_details_url(self):
+        return (
             self.aws_console_base_url
             + f"cloudformation/home?region={self.config.region}#/stacks/"
             + "stackinfo?filteringStatus=active&filteringText=&viewNested=true"
             + "&hideStacks=false&stackId={stack_id}"
         )
+
+    def inventory_options(self) -> Iterator[dict]:
+        return self.list_stacks()
+
+    def list_stacks(self):
+        STACK_DETAILS_URL = self.stack_details_url()
         TITLE_FORMAT = "{stack_name} | {stack_status}"
 
-        session = create_session()
-        client = session.client("cloudformation")
-        list_stacks_resp = client.list_stacks()
-        stacks = list_stacks_resp["StackSummaries"]
-        while list_stacks_resp.get("NextToken") is not None:
-            list_stacks_resp = client.list_stacks(
-                NextToken=list_stacks_resp["NextToken"]
-            )
-            stacks.extend(list_stacks_resp["StackSummaries"])
-        active_stacks = filter(
-            lambda s: s.get("DeletionTime") is None,
-            stacks,
-        )
-        resp = []
-        for stack in active_stacks:
+        client = create_client("cloudformation", self.config)
+        versions = {}
+        for stack in paginate(
+            client,
+            "list_stacks",
+            "StackSummaries",
+            StackStatusFilter=ACTIVE_STACK_STATUSES,
+        ):
             stack_name = stack["StackName"]
             stack_status = stack["StackStatus"]
             stack_id = stack["StackId"]
-            resp.append(
-                {
-                    "title": TITLE_FORMAT.format(
-                        stack_name=stack_name, stack_status=stack_status
-                    ),
-                    "action": {
-                        "type": Actions.OPEN_URL,
-                        "url": STACK_DETAILS_URL.format(stack_id=stack_id),
-                    },
-                }
+            versions[stack_id] = stack_version(stack)
+            yield {
+                "title": TITLE_FORMAT.format(
+                    stack_name=stack_name, stack_status=stack_status
+                ),
+                "action": {
+                    "type": Actions.OPEN_URL,
+                    "url": STACK_DETAILS_URL.format(stack_id=stack_id),
+                },
+                "moveAction": {
+                    "type": Actions.ADD_PARAM,
+                    "name": "stack-id",
+                    "value": stack_id,
+                },
+            }
+        StackIndex(self.config).store(versions)
+
+    def tagged_options(
+        self, resources: List["TaggedResource"]
+    ) -> Iterator[dict]:
+        """
+        Stack statuses are only listed by list_stacks,
+        which lists every stack for the same number of calls.
+        """
+        return self.list_stacks()
+
+    def cached_stack_details(
+        self, stack_id: str, refresh: bool
+    ) -> Iterator[dict]:
+        """
+        Details are fetched again only when the stack changed
+        since they were cached, according to the last stack listing.
+        """
+        cache = ViewCache(self.config, self.service_id)
+        view = stack_view(stack_id)
+        version = StackIndex(self.config).version(stack_id)
+        entry = cache.load(view)
+        if (
+            entry is None
+            or refresh
+            or version is None
+            or entry.version != version
+        ):
+            return cache.store(view, self.stack_details(stack_id), version)
+        return entry.options()
+
+    def stack_details(self, stack_id: str) -> Iterator[dict]:
+        """
+        Stack, resources and recent events are fetched concurrently.
+        """
+        client = create_client("cloudformation", self.config)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            stacks = executor.submit(
+                in_current_context(client.describe_stacks), StackName=stack_id
             )
-        return resp
+            resources = executor.submit(
+                in_current_context(client.describe_stack_resources),
+                StackName=stack_id,
+            )
+            events = executor.submit(
+                in_current_context(client.describe_stack_events),
+                StackName=stack_id,
+            )
+            stack = stacks.result()["Stacks"][0]
+            stack_resources = resources.result()["StackResources"]
+            stack_events = events.result()["StackEvents"][:RECENT_EVENTS]
+
+        yield {
+            "title": f"{stack['StackName']} | {stack['StackStatus']}",
+            "action": {
+                "type": Actions.OPEN_URL,
+                "url": self.stack_details_url().format(stack_id=stack_id),
+            },
+        }
+        for output in stack.get("Outputs", []):
+            yield {
+                "title": (
+                    f"Output {output['OutputKey']} = {output['OutputValue']}"
+                ),
+                "action": {
+                    "type": Actions.COPY,
+                    "value": output["OutputValue"],
+                },
+            }
+        for resource in stack_resources:
+            physical_id = resource.get("PhysicalResourceId", "")
+            yield {
+                "title": (
+                    f"Resource {resource['LogicalResourceId']} | "
+                    f"{resource['ResourceType']} | "
+                    f"{resource['ResourceStatus']}"
+                ),
+                "action": {"type": Actions.COPY, "value": physical_id},
+            }
+        for event in stack_events:
+            reason = event.get("ResourceStatusReason", "")
+            yield {
+                "title": (
+                    f"Event {event['Timestamp']} | "
+                    f"{event['LogicalResourceId']} | "
+                    f"{event['ResourceStatus']} {reason}"
+                ).rstrip(),
+                "action": {"type": Actions.COPY, "value": reason},
+            }
@@ -1,30 +1,11 @@
 import argparse
+import dataclasses
 import json
 import os
 import pathlib
+from typing import List, TextIO
 
-from utils.aws import Config
-
-
-def get_config_path():
-    return os.path.join(
-        os.environ.get("APPDATA")
-        or os.environ.get("XDG_CONFIG_HOME")
-        or os.path.join(os.environ["HOME"], ".config"),
-        "aws_slapdash",
-    )
-
-
-def load_config() -> Config:
-    config_path = get_config_path()
-    with open(os.path.join(config_path, "config.json")) as json_file:
-        config_source = json.load(json_file)
-        config = Config(
-            aws_profile=config_source["profile"],
-            region=config_source["region"],
-            aws_vault=config_source["awsVault"],
-        )
-        return config
+from utils.aws import Config, get_config_path, load_config
 
 
 def store_config(config: Config):
@@ -32,15 +13,34 @@ def store_config(config: Config):
     pathlib.Path(config_path).mkdir(exist_ok=True)
     config_file = os.path.join(config_path, "config.json")
     with open(config_file, "w+") as json_file:
+        profiles = config.aws_profiles or [config.aws_profile]
+        regions = config.regions or [config.region]
         config_json = {
-            "profile": config.aws_profile,
-            "region": config.region,
+            "profile": profiles if len(profiles) > 1 else profiles[0],
+            "region": regions if len(regions) > 1 else regions[0],
             "awsVault": config.aws_vault,
+            "cacheTtl": config.cache_ttl,
+            "fanoutTimeout": config.fanout_timeout,
+            "fanoutWorkers": config.fanout_workers,
+            "maxResults": config.max_results,
+            "prefetchCount": config.prefetch_count,
+            "inventoryBackend": config.inventory_backend,
+            "backgroundSync": config.background_sync,
+            "renderDeadline": config.render_deadline,
         }
         json_file.write(json.dumps(config_json))
 
 
-def serve_config_command(arg_parser: argparse.ArgumentParser):
+def with_first(values: List[str], first: str) -> List[str]:
+    """
+    Makes `first` the primary value, keeping the others it fans out to.
+    """
+    return [first] + [value for value in values if value != first]
+
+
+def serve_config_command(
+    arg_parser: argparse.ArgumentParser, argv: List[str], out: TextIO
+):
     arg_parser.add_argument(
         "--profile",
     )
@@ -50,16 +50,25 @@ def serve_config_command(arg_parser: argparse.ArgumentParser):
     arg_parser.add_argument(
         "--use-aws-vault", action="store", default=False, type=bool
     )
-    args = arg_parser.parse_args()
-    if args.profile and args.region and args.use_aws_vault:
-        config = Config(args.profile, args.region, args.use_aws_vault)
-        store_config(config)
-
+    args = arg_parser.parse_args(argv)
     try:
         config = load_config()
     except FileNotFoundError:
         config = Config("", "", False)
 
+    if args.profile and args.region and args.use_aws_vault:
+        # The form only edits the primary profile and region,
+        # everything else is kept as configured
+        config = dataclasses.replace(
+            config,
+            aws_profile=args.profile,
+            region=args.region,
+            aws_profiles=with_first(config.aws_profiles, args.profile),
+            regions=with_first(config.regions, args.region),
+            aws_vault=args.use_aws_vault,
+        )
+        store_config(config)
+
     print(
         json.dumps(
             {
@@ -107,5 +116,6 @@ def serve_config_command(arg_parser: argparse.ArgumentParser):
                     ],
                 }
             }
-        )
+        ),
+        file=out,
     )
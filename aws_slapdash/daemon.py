@@ -0,0 +1,72 @@
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+
+import aws
+from utils.aws import get_config_path
+from utils.daemon_client import daemon_socket_path
+from utils.sync import sync_forever
+from utils.trace import skip_startup_span
+
+
+def run_command(argv) -> str:
+    """
+    Requests run concurrently, each writing its view to its own buffer.
+    """
+    output = io.StringIO()
+    try:
+        aws.server_aws_command(argv, output)
+    except SystemExit:
+        # argparse exits after printing its usage to stderr
+        pass
+    except Exception:
+        return json.dumps({"view": traceback.format_exc()})
+    return output.getvalue()
+
+
+class CommandRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        self.wfile.write(run_command(request["argv"]).encode("utf8"))
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_daemon():
+    """
+    Keeps sessions, clients and their connections warm between invocations,
+    and the listings fresh when backgroundSync is set.
+    """
+    path = daemon_socket_path(get_config_path())
+    if os.path.exists(path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(path)
+            except OSError:
+                # Left behind by a daemon that did not shut down cleanly
+                os.unlink(path)
+            else:
+                sys.exit(f"aws-slapdash daemon is already running on {path}")
+    old_umask = os.umask(0o077)
+    try:
+        server = DaemonServer(path, CommandRequestHandler)
+    finally:
+        os.umask(old_umask)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    skip_startup_span()
+    threading.Thread(target=sync_forever, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
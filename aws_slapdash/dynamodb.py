@@ -1,12 +1,95 @@
 import argparse
-import json
+import hashlib
+import itertools
+import os
+import time
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
 
-from utils.aws import create_session
+from utils.aws import Config, create_client, get_config_path
 from utils.command import AWSServiceCommand
-from utils.slapdash import Actions
+from utils.jsonfile import read_json, write_json
+from utils.paginate import paginate
+from utils.slapdash import Actions, started, write_list_view
+
+if TYPE_CHECKING:
+    from utils.tagging import TaggedResource
+
+# DynamoDB only updates ItemCount and TableSizeBytes about every six hours,
+# billing modes and indexes change as rarely
+TABLE_METADATA_TTL = 6 * 60 * 60
+# list_tables returns at most 100 names per page
+LIST_TABLES_PAGE_SIZE = 100
+ENRICHED_VIEW = "tables?enriched"
+
+
+def table_metadata(table: dict) -> dict:
+    """
+    The slow changing part of describe_table the views show. The status
+    is left out, a table is only CREATING or UPDATING for minutes.
+    """
+    return {
+        "itemCount": table["ItemCount"],
+        "sizeBytes": table["TableSizeBytes"],
+        "billingMode": table.get("BillingModeSummary", {}).get(
+            "BillingMode", "PROVISIONED"
+        ),
+        "gsiCount": len(table.get("GlobalSecondaryIndexes", [])),
+    }
+
+
+def format_size(size_bytes: int) -> str:
+    size = float(size_bytes)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class TableMetadataCache:
+    """
+    Table metadata of one profile and region, kept on disk
+    for as long as DynamoDB itself takes to refresh it.
+    """
+
+    def __init__(self, config: Config):
+        target = f"{config.aws_profile}|{config.region}"
+        digest = hashlib.sha256(target.encode()).hexdigest()
+        self.path = os.path.join(
+            get_config_path(), "dynamodb", f"{digest}.json"
+        )
+        self.tables: Dict[str, dict] = read_json(self.path, {})
+
+    def get(self, table_name: str) -> Optional[dict]:
+        cached = self.tables.get(table_name)
+        if cached is None:
+            return None
+        if time.time() - cached["fetchedAt"] > TABLE_METADATA_TTL:
+            return None
+        return cached["metadata"]
+
+    def put(self, table_name: str, metadata: dict):
+        self.tables[table_name] = {
+            "fetchedAt": time.time(),
+            "metadata": metadata,
+        }
+
+    def save(self):
+        write_json(self.path, self.tables)
 
 
 class DynamoDBCommand(AWSServiceCommand):
+    service_id = "dynamodb"
+    inventory_view = "tables"
+
     def service_name(self):
         return "DynamoDB"
 
@@ -16,67 +99,160 @@ class DynamoDBCommand(AWSServiceCommand):
             + f"dynamodbv2/home?region={self.config.region}#"
         )
 
-    def serve_command(self, arg_parser: argparse.ArgumentParser):
+    def serve_command(
+        self, arg_parser: argparse.ArgumentParser, argv: List[str], out: TextIO
+    ):
         arg_parser.add_argument(
             "--table-name",
             help="Id of instance to manage",
         )
-        args = arg_parser.parse_args()
-        resource_id = args.table_name
-        print(
-            json.dumps(
-                {
-                    "view": {
-                        "type": "list",
-                        "options": self.serve_dynamodb_command(resource_id),
-                    }
-                }
-            )
+        arg_parser.add_argument(
+            "--enriched",
+            help="Show item count, size, billing mode and GSIs in the list",
         )
+        args = arg_parser.parse_args(argv)
+        write_list_view(self.serve_dynamodb_command(args), out)
 
-    def list_dd_tables(self, client):
+    def table_option(
+        self, table_name: str, metadata: Optional[dict] = None
+    ) -> dict:
         DYNAMO_DB_DETAILS_URL = (
             self.aws_console_base_url
             + f"dynamodbv2/home?region={self.config.region}#"
             + "table?name={table_name}"
         )
         TITLE_FORMAT = "{table_name}"
-        list_tables_resp = client.list_tables()
-        tables = list_tables_resp["TableNames"]
-        while list_tables_resp.get("LastEvaluatedTableName") is not None:
-            tables.extend(list_tables_resp["TableNames"])
-            list_tables_resp = client.list_tables()
-        resp = []
-        for table in tables:
-            table_name = table
-            resp.append(
-                {
-                    "title": TITLE_FORMAT.format(
-                        table_name=table_name,
-                    ),
-                    "action": {
-                        "type": "open-url",
-                        "url": DYNAMO_DB_DETAILS_URL.format(
-                            table_name=table_name
-                        ),
-                    },
-                    "moveAction": {
-                        "type": "add-param",
-                        "name": "table-name",
-                        "value": table_name,
-                    },
-                }
+        ENRICHED_TITLE_FORMAT = (
+            "{table_name} | {itemCount} items | {size} | "
+            "{billingMode} | {gsiCount} GSIs"
+        )
+        if metadata is None:
+            title = TITLE_FORMAT.format(table_name=table_name)
+        else:
+            title = ENRICHED_TITLE_FORMAT.format(
+                table_name=table_name,
+                size=format_size(metadata["sizeBytes"]),
+                **metadata,
             )
-        return resp
+        return {
+            "title": title,
+            "action": {
+                "type": "open-url",
+                "url": DYNAMO_DB_DETAILS_URL.format(table_name=table_name),
+            },
+            "moveAction": {
+                "type": "add-param",
+                "name": "table-name",
+                "value": table_name,
+            },
+        }
 
-    def serve_dynamodb_command(self, table_name):
-        session = create_session()
-        client = session.client("dynamodb")
+    def tagged_options(
+        self, resources: List["TaggedResource"]
+    ) -> Iterator[dict]:
+        for resource in resources:
+            yield self.table_option(resource.resource_id.split("/", 1)[1])
+
+    def inventory_options(self) -> Iterator[dict]:
+        return self.list_dd_tables(create_client("dynamodb", self.config))
+
+    def list_dd_tables(self, client, enriched: bool = False):
+        table_names = paginate(
+            client,
+            "list_tables",
+            "TableNames",
+            page_size=LIST_TABLES_PAGE_SIZE,
+        )
+        if enriched:
+            metadata_cache = TableMetadataCache(self.config)
+            tables = self.describe_tables(metadata_cache, table_names)
+        else:
+            tables = ((table_name, None) for table_name in table_names)
+        for table_name, metadata in tables:
+            yield self.table_option(table_name, metadata)
+        if enriched:
+            metadata_cache.save()
+
+    def describe_tables(
+        self,
+        metadata_cache: TableMetadataCache,
+        table_names: Iterator[str],
+    ) -> Iterator[Tuple[str, dict]]:
+        """
+        Only tables without fresh cached metadata are described,
+        concurrently and in listing order.
+        """
+        names, to_describe = itertools.tee(table_names)
+        for table_name, described in zip(
+            names,
+            self.run_concurrently(
+                "dynamodb",
+                (
+                    (
+                        None
+                        if metadata_cache.get(table_name) is not None
+                        else ("describe_table", {"TableName": table_name})
+                    )
+                    for table_name in to_describe
+                ),
+            ),
+        ):
+            if described is None:
+                metadata = metadata_cache.get(table_name)
+            else:
+                metadata = table_metadata(described["Table"])
+                metadata_cache.put(table_name, metadata)
+            yield table_name, metadata
+
+    def serve_dynamodb_command(self, args: argparse.Namespace):
+        table_name = args.table_name
         if not table_name:
-            return self.list_dd_tables(client)
-        table = client.describe_table(TableName=table_name)["Table"]
-        item_count = table["ItemCount"]
-        table_size = table["TableSizeBytes"]
+            return self.serve_tables(args)
+        command, table_name = self.split_target(table_name)
+        return command.table_details(table_name)
+
+    def serve_tables(self, args: argparse.Namespace) -> Iterator[dict]:
+        enriched = bool(args.enriched)
+        # Started before the toggle is yielded
+        options = started(
+            self.cached_options(
+                args,
+                ENRICHED_VIEW if enriched else self.inventory_view,
+                lambda: self.fan_out_options(
+                    lambda command: command.list_dd_tables(
+                        create_client("dynamodb", command.config), enriched
+                    )
+                ),
+            )
+        )
+        if not enriched:
+            enriched_param = {
+                "type": Actions.ADD_PARAM,
+                "name": "enriched",
+                "value": "true",
+            }
+            yield {
+                "title": "Show item counts, sizes and billing modes",
+                "action": enriched_param,
+                "moveAction": enriched_param,
+            }
+        yield from options
+
+    def table_details(self, table_name: str):
+        """
+        Described live for the current status,
+        the metadata cache of the enriched list is refreshed on the way.
+        """
+        table = create_client("dynamodb", self.config).describe_table(
+            TableName=table_name
+        )["Table"]
+        metadata = table_metadata(table)
+        metadata_cache = TableMetadataCache(self.config)
+        metadata_cache.put(table_name, metadata)
+        metadata_cache.save()
+        status = table["TableStatus"]
+        item_count = metadata["itemCount"]
+        table_size = metadata["sizeBytes"]
         return [
             {
                 "title": "Query Items",
@@ -84,7 +260,8 @@ class DynamoDBCommand(AWSServiceCommand):
                     "type": Actions.OPEN_URL,
                     "url": (
                         self.aws_console_base_url
-                        + "dynamodbv2/home?table&table&region=eu-west-1#"
+                        + "dynamodbv2/home?table&table"
+                        + f"&region={self.config.region}#"
                         + "item-explorer?initialTagKey=&maximize=true"
                         + f"&table={table_name}"
                     ),
@@ -95,7 +272,25 @@ class DynamoDBCommand(AWSServiceCommand):
                 "action": {"type": Actions.COPY, "value": str(item_count)},
             },
             {
-                "title": f"Table Size: {table_size}",
+                "title": f"Table Size: {format_size(table_size)}",
                 "action": {"type": Actions.COPY, "value": str(table_size)},
             },
+            {
+                "title": f"Billing mode: {metadata['billingMode']}",
+                "action": {
+                    "type": Actions.COPY,
+                    "value": metadata["billingMode"],
+                },
+            },
+            {
+                "title": f"Global secondary indexes: {metadata['gsiCount']}",
+                "action": {
+                    "type": Actions.COPY,
+                    "value": str(metadata["gsiCount"]),
+                },
+            },
+            {
+                "title": f"Status: {status}",
+                "action": {"type": Actions.COPY, "value": status},
+            },
         ]
@@ -1,37 +1,103 @@
-import json
-from argparse import ArgumentParser
-from typing import Optional
+import itertools
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    TYPE_CHECKING,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    TextIO,
+)
 
-from utils.slapdash import Actions
+from utils.aws import Config, create_client
+from utils.chunks import chunked
+from utils.command import AWSServiceCommand
+from utils.paginate import paginate
+from utils.slapdash import Actions, started, write_list_view
+from utils.trace import in_current_context
 
-from aws_slapdash.utils.aws import Config, create_session
-from aws_slapdash.utils.command import AWSServiceCommand
+if TYPE_CHECKING:
+    from utils.tagging import TaggedResource
+
+# Largest page describe_instances returns
+DESCRIBE_INSTANCES_PAGE_SIZE = 1000
+# Most values a single describe_instances filter accepts
+FILTER_VALUES_LIMIT = 200
+
+
+class InstanceRow(NamedTuple):
+    """
+    The part of an instance description the list view shows.
+    """
+
+    instance_id: str
+    name: str
+    state: str
+
+    @classmethod
+    def from_instance(cls, instance: dict) -> "InstanceRow":
+        name = "{no name}"
+        for tag in instance.get("Tags", []):
+            if tag["Key"] == "Name":
+                name = tag["Value"]
+        return cls(instance["InstanceId"], name, instance["State"]["Name"])
+
+
+def instance_filters(state: Optional[str], tags: List[str]) -> List[dict]:
+    """
+    Builds describe_instances filters, so instances are filtered by AWS.
+    Tags are given as `key=value`, or just `key` to match any value.
+    """
+    filters = []
+    if state:
+        filters.append(
+            {"Name": "instance-state-name", "Values": state.split(",")}
+        )
+    for tag in tags:
+        key, _, value = tag.partition("=")
+        if value:
+            filters.append({"Name": f"tag:{key}", "Values": [value]})
+        else:
+            filters.append({"Name": "tag-key", "Values": [key]})
+    return filters
+
+
+def details_view(instance_id: str) -> str:
+    return f"instance:{instance_id}"
 
 
 class Ec2Command(AWSServiceCommand):
+    service_id = "ec2"
+    inventory_view = "instances"
+    drilldown_param = "instance-id"
+
     def __init__(self, config: Config):
         self.config = config
 
     def service_name(self):
         return "EC2"
 
-    def serve_command(self, arg_parser: ArgumentParser):
+    def serve_command(
+        self, arg_parser: ArgumentParser, argv: List[str], out: TextIO
+    ):
         arg_parser.add_argument(
             "--instance-id",
             help="Id of instance to manage",
         )
-        args = arg_parser.parse_args()
-
-        print(
-            json.dumps(
-                {
-                    "view": {
-                        "type": "list",
-                        "options": self.get_ec2_optoins(args.instance_id),
-                    }
-                }
-            )
+        arg_parser.add_argument(
+            "--instance-state",
+            help="Comma separated instance states to list",
         )
+        arg_parser.add_argument(
+            "--tag",
+            action="append",
+            default=[],
+            help="Only list instances with this tag, as key=value or key",
+        )
+        args = arg_parser.parse_args(argv)
+
+        write_list_view(self.get_ec2_optoins(args), out)
 
     def service_url(self):
         return f"{self.aws_console_base_url}ec2/home"
@@ -40,13 +106,90 @@ class Ec2Command(AWSServiceCommand):
     def aws_console_base_url(self) -> str:
         return f"https://{self.config.region}.console.aws.amazon.com/"
 
-    def get_ec2_optoins(self, instance_id: Optional[str] = None):
-        session = create_session()
-        client = session.client("ec2")
-        resource = session.resource("ec2")
+    def get_ec2_optoins(self, args: Namespace):
+        instance_id = args.instance_id
         if not instance_id:
-            return self.list_ec2_instances(client)
-        instance = resource.Instance(instance_id)
+            filters = instance_filters(args.instance_state, args.tag)
+            view = self.inventory_view
+            if filters:
+                view += "?" + "&".join(
+                    f"{f['Name']}={','.join(f['Values'])}" for f in filters
+                )
+            filter_options = []
+            if not args.instance_state:
+                state_param = {
+                    "type": Actions.ADD_PARAM,
+                    "name": "instance-state",
+                    "value": "running",
+                }
+                filter_options.append(
+                    {
+                        "title": "Only running instances",
+                        "action": state_param,
+                        "moveAction": state_param,
+                    }
+                )
+            # Started before the filter options are written
+            return itertools.chain(
+                filter_options,
+                started(
+                    self.cached_options(
+                        args,
+                        view,
+                        lambda: self.fan_out_options(
+                            lambda command: command.list_ec2_instances(
+                                create_client("ec2", command.config), filters
+                            )
+                        ),
+                    )
+                ),
+            )
+        self.record_selection(args, instance_id)
+        command, instance_id = self.split_target(instance_id)
+        return command.cached_details(
+            details_view(instance_id),
+            bool(args.refresh),
+            lambda: command.instance_details(instance_id),
+        )
+
+    def drilldown_cached(self, resource: str) -> bool:
+        return self.details_cached(details_view(resource))
+
+    def prefetch_drilldown(self, resource: str):
+        for _ in self.cached_details(
+            details_view(resource),
+            True,
+            lambda: self.instance_details(resource),
+        ):
+            pass
+
+    def ssm_ping_status(self, instance_id: str) -> str:
+        client = create_client("ssm", self.config)
+        try:
+            information = client.describe_instance_information(
+                Filters=[{"Key": "InstanceIds", "Values": [instance_id]}]
+            )["InstanceInformationList"]
+        except client.exceptions.ClientError:
+            return "unknown"
+        if not information:
+            return "not managed"
+        return information[0]["PingStatus"]
+
+    def instance_details(self, instance_id: str):
+        """
+        Everything shown comes from one describe_instances call,
+        the SSM status is requested alongside it.
+        """
+        client = create_client("ec2", self.config)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            ssm_status = executor.submit(
+                in_current_context(self.ssm_ping_status), instance_id
+            )
+            reservations = client.describe_instances(
+                InstanceIds=[instance_id]
+            )["Reservations"]
+            instance = reservations[0]["Instances"][0]
+            ssm_status = ssm_status.result()
         EC2_SSM_CONNECT = (
             f"{self.aws_console_base_url}systems-manager/session-manager/"
             "{instance_id}"
@@ -54,9 +197,14 @@ class Ec2Command(AWSServiceCommand):
         )
         # Could not find an easy way to get key type
         key_type = "pem"
+        public_dns_name = instance.get("PublicDnsName", "")
+        private_ip = instance.get("PrivateIpAddress", "")
+        instance_type = instance["InstanceType"]
+        availability_zone = instance["Placement"]["AvailabilityZone"]
+        launch_time = str(instance["LaunchTime"])
         return [
             {
-                "title": "Connect Via SSM",
+                "title": f"Connect Via SSM ({ssm_status})",
                 "action": {
                     "type": Actions.OPEN_URL,
                     "url": EC2_SSM_CONNECT.format(instance_id=instance_id),
@@ -66,7 +214,7 @@ class Ec2Command(AWSServiceCommand):
                 "title": "Copy public DNS name",
                 "action": {
                     "type": Actions.COPY,
-                    "value": instance.public_dns_name,
+                    "value": public_dns_name,
                 },
             },
             {
@@ -74,47 +222,92 @@ class Ec2Command(AWSServiceCommand):
                 "action": {
                     "type": Actions.COPY,
                     "value": (
-                        f"ssh -i '{instance.key_name}.{key_type}' "
-                        f"ec2-user@{instance.public_dns_name}"
+                        f"ssh -i '{instance.get('KeyName')}.{key_type}' "
+                        f"ec2-user@{public_dns_name or private_ip}"
                     ),
                 },
             },
+            {
+                "title": f"Private IP: {private_ip}",
+                "action": {"type": Actions.COPY, "value": private_ip},
+            },
+            {
+                "title": f"Type: {instance_type} | {availability_zone}",
+                "action": {"type": Actions.COPY, "value": instance_type},
+            },
+            {
+                "title": f"Launched: {launch_time}",
+                "action": {"type": Actions.COPY, "value": launch_time},
+            },
         ]
 
-    def list_ec2_instances(self, client):
-        ec2_instances = client.describe_instances()
-        instances = []
-        for reservation in ec2_instances["Reservations"]:
-            instances.extend(reservation["Instances"])
+    def list_instance_rows(
+        self, client, filters: List[dict]
+    ) -> Iterator[InstanceRow]:
+        for reservation in paginate(
+            client,
+            "describe_instances",
+            "Reservations",
+            page_size=DESCRIBE_INSTANCES_PAGE_SIZE,
+            Filters=filters,
+        ):
+            for instance in reservation["Instances"]:
+                yield InstanceRow.from_instance(instance)
+
+    def instance_option(self, row: InstanceRow) -> dict:
+        INSTANCE_DETAILS_URL = (
+            f"{self.service_url()}?region={self.config.region}"
+            "#InstanceDetails:instanceId={instance_id}"
+        )
         TITLE_FORMAT = "{instance_name} | {instance_id} | {instance_state} "
-        resp = []
-        for instance in instances:
-            id = instance["InstanceId"]
-            state = instance["State"]["Name"]
-            name = "{no name}"
-            for tag in instance.get("Tags", []):
-                if tag["Key"] == "Name":
-                    name = tag["Value"]
-
-            resp.append(
-                {
-                    "title": TITLE_FORMAT.format(
-                        instance_name=name,
-                        instance_id=id,
-                        instance_state=state,
-                    ),
-                    "action": {
-                        "type": Actions.OPEN_URL,
-                        "url": (
-                            f"{self.service_url}?region=eu-west-1"
-                            f"#InstanceDetails:instanceId={id}"
-                        ),
-                    },
-                    "moveAction": {
-                        "type": "add-param",
-                        "name": "instance-id",
-                        "value": id,
-                    },
-                }
-            )
-        return resp
+        return {
+            "title": TITLE_FORMAT.format(
+                instance_name=row.name,
+                instance_id=row.instance_id,
+                instance_state=row.state,
+            ),
+            "action": {
+                "type": Actions.OPEN_URL,
+                "url": INSTANCE_DETAILS_URL.format(
+                    instance_id=row.instance_id
+                ),
+            },
+            "moveAction": {
+                "type": "add-param",
+                "name": "instance-id",
+                "value": row.instance_id,
+            },
+        }
+
+    def inventory_options(self) -> Iterator[dict]:
+        return self.list_ec2_instances(create_client("ec2", self.config))
+
+    def list_ec2_instances(self, client, filters: Optional[List[dict]] = None):
+        for row in self.list_instance_rows(client, filters or []):
+            yield self.instance_option(row)
+
+    def tagged_options(
+        self, resources: List["TaggedResource"]
+    ) -> Iterator[dict]:
+        """
+        The tagging API lacks the instance state, tagged instances are
+        described by id, concurrently and without paging.
+        """
+        instance_ids = (
+            resource.resource_id.split("/", 1)[1] for resource in resources
+        )
+        for described in self.run_concurrently(
+            "ec2",
+            (
+                (
+                    "describe_instances",
+                    {"Filters": [{"Name": "instance-id", "Values": chunk}]},
+                )
+                for chunk in chunked(instance_ids, FILTER_VALUES_LIMIT)
+            ),
+        ):
+            for reservation in described["Reservations"]:
+                for instance in reservation["Instances"]:
+                    yield self.instance_option(
+                        InstanceRow.from_instance(instance)
+                    )
@@ -1,46 +1,108 @@
-import json
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
+from collections import Counter
+from typing import TYPE_CHECKING, Iterable, Iterator, List, TextIO
 
-from utils.slapdash import Actions
+from utils.aws import Config, create_client
+from utils.chunks import chunked
+from utils.command import AWSServiceCommand
+from utils.paginate import paginate
+from utils.slapdash import Actions, write_list_view
 
-from aws_slapdash.utils.aws import Config, create_session
-from aws_slapdash.utils.command import AWSServiceCommand
+if TYPE_CHECKING:
+    from utils.tagging import TaggedResource
+
+# Most resources a single describe call accepts
+DESCRIBE_CLUSTERS_LIMIT = 100
+DESCRIBE_TASKS_LIMIT = 100
+DESCRIBE_SERVICES_LIMIT = 10
+
+SERVICES_VIEW = "services"
+TASK_DEFINITIONS_VIEW = "task-definitions"
+
+
+def tasks_view(cluster_name: str) -> str:
+    return f"tasks:{cluster_name}"
 
 
 class EcsCommand(AWSServiceCommand):
+    service_id = "ecs"
+    inventory_view = "clusters"
+    drilldown_param = "cluster-name"
+
     def __init__(self, config: Config):
         self.config = config
 
     def service_name(self):
         return "ECS"
 
-    def serve_command(self, arg_parser: ArgumentParser):
+    def serve_command(
+        self, arg_parser: ArgumentParser, argv: List[str], out: TextIO
+    ):
         arg_parser.add_argument(
             "--cluster-name",
         )
-        args = arg_parser.parse_args()
-        print(
-            json.dumps(
-                {
-                    "view": {
-                        "type": "list",
-                        "options": self.get_ecs_options(args.cluster_name),
-                    }
-                }
-            )
+        arg_parser.add_argument(
+            "--ecs-view",
+            choices=[SERVICES_VIEW, TASK_DEFINITIONS_VIEW],
         )
+        args = arg_parser.parse_args(argv)
+        write_list_view(self.get_ecs_options(args), out)
 
     def service_url(self):
         return f"{self.aws_console_base_url}ecs/v2/clusters/"
 
-    def get_ecs_options(self, cluster_name: str):
-        session = create_session()
-        client = session.client("ecs")
+    def get_ecs_options(self, args: Namespace):
+        cluster_name = args.cluster_name
         if not cluster_name:
-            return self.list_clusters(client)
-        CLUSTER_TASKS_URL = (
-            self.cluster_url() + f"/task?region={self.config.region}"
+            return self.cached_options(
+                args,
+                self.inventory_view,
+                lambda: self.fan_out_options(
+                    lambda command: command.inventory_options()
+                ),
+            )
+        command, cluster_name = self.split_target(cluster_name)
+        if args.ecs_view == SERVICES_VIEW:
+            return command.cluster_services(cluster_name)
+        if args.ecs_view == TASK_DEFINITIONS_VIEW:
+            return command.cluster_task_definitions(cluster_name)
+        self.record_selection(args, args.cluster_name)
+        return command.cached_details(
+            tasks_view(cluster_name),
+            bool(args.refresh),
+            lambda: command.cluster_tasks(cluster_name),
+        )
+
+    def drilldown_cached(self, resource: str) -> bool:
+        return self.details_cached(tasks_view(resource))
+
+    def prefetch_drilldown(self, resource: str):
+        for _ in self.cached_details(
+            tasks_view(resource),
+            True,
+            lambda: self.cluster_tasks(resource),
+        ):
+            pass
+
+    def describe_cluster_tasks(self, cluster_name: str) -> Iterator[dict]:
+        """
+        Pages through all tasks of the cluster and describes them
+        in concurrent chunks of the size describe_tasks accepts.
+        """
+        client = create_client("ecs", self.config)
+        task_arns = paginate(
+            client, "list_tasks", "taskArns", cluster=cluster_name
         )
+        for described in self.run_concurrently(
+            "ecs",
+            (
+                ("describe_tasks", {"cluster": cluster_name, "tasks": chunk})
+                for chunk in chunked(task_arns, DESCRIBE_TASKS_LIMIT)
+            ),
+        ):
+            yield from described["tasks"]
+
+    def cluster_tasks(self, cluster_name: str):
         CLUSTER_RUN_TASK_URL = (
             self.cluster_url() + f"/run-task?region={self.config.region}"
         )
@@ -49,68 +111,146 @@ class EcsCommand(AWSServiceCommand):
             + "/tasks/{short_name}/logs"
             + f"?region={self.config.region}"
         )
-        resp = [
-            {
-                "title": "Run a new task",
-                "action": {
-                    "type": Actions.OPEN_URL,
-                    "url": CLUSTER_RUN_TASK_URL.format(
-                        cluster_name=cluster_name
-                    ),
-                },
+        yield {
+            "title": "Run a new task",
+            "action": {
+                "type": Actions.OPEN_URL,
+                "url": CLUSTER_RUN_TASK_URL.format(cluster_name=cluster_name),
             },
-        ]
-        list_tasks_resp = client.list_tasks(cluster=cluster_name)
-        if not list_tasks_resp["taskArns"]:
-            return resp
-        describe_tasks_resp = client.describe_tasks(
-            cluster=cluster_name, tasks=list_tasks_resp["taskArns"]
-        )
-        for task in describe_tasks_resp["tasks"]:
+        }
+        for ecs_view, title in [
+            (SERVICES_VIEW, "Services"),
+            (TASK_DEFINITIONS_VIEW, "Tasks by task definition"),
+        ]:
+            view_param = {
+                "type": Actions.ADD_PARAM,
+                "name": "ecs-view",
+                "value": ecs_view,
+            }
+            yield {
+                "title": title,
+                "action": view_param,
+                "moveAction": view_param,
+            }
+        for task in self.describe_cluster_tasks(cluster_name):
             task_arn = task["taskArn"]
             short_name = task_arn.split("/")[-1]
             task_definition_short_name = task["taskDefinitionArn"].split("/")[
                 -1
             ]
-            resp.append(
-                {
-                    "title": f"Task {task_definition_short_name} Logs",
+            yield {
+                "title": f"Task {task_definition_short_name} Logs",
+                "action": {
+                    "type": Actions.OPEN_URL,
+                    "url": TASK_LOGS_URL.format(
+                        cluster_name=cluster_name, short_name=short_name
+                    ),
+                },
+            }
+
+    def cluster_services(self, cluster_name: str):
+        SERVICE_URL = (
+            self.cluster_url()
+            + "/services/{service_name}/health"
+            + f"?region={self.config.region}"
+        )
+        TITLE_FORMAT = "{service_name} | {status} | {running}/{desired}"
+        client = create_client("ecs", self.config)
+        service_arns = paginate(
+            client, "list_services", "serviceArns", cluster=cluster_name
+        )
+        for described in self.run_concurrently(
+            "ecs",
+            (
+                (
+                    "describe_services",
+                    {"cluster": cluster_name, "services": chunk},
+                )
+                for chunk in chunked(service_arns, DESCRIBE_SERVICES_LIMIT)
+            ),
+        ):
+            for service in described["services"]:
+                service_name = service["serviceName"]
+                yield {
+                    "title": TITLE_FORMAT.format(
+                        service_name=service_name,
+                        status=service["status"],
+                        running=service["runningCount"],
+                        desired=service["desiredCount"],
+                    ),
                     "action": {
                         "type": Actions.OPEN_URL,
-                        "url": TASK_LOGS_URL.format(
-                            cluster_name=cluster_name, short_name=short_name
+                        "url": SERVICE_URL.format(
+                            cluster_name=cluster_name,
+                            service_name=service_name,
                         ),
                     },
-                },
-            )
+                }
 
-        return resp
+    def cluster_task_definitions(self, cluster_name: str):
+        TASK_DEFINITION_URL = (
+            self.aws_console_base_url
+            + "ecs/v2/task-definitions/{family}/{revision}"
+            + f"?region={self.config.region}"
+        )
+        TITLE_FORMAT = "{task_definition} | {tasks} tasks, {running} running"
+        tasks: Counter = Counter()
+        running: Counter = Counter()
+        for task in self.describe_cluster_tasks(cluster_name):
+            task_definition = task["taskDefinitionArn"].split("/")[-1]
+            tasks[task_definition] += 1
+            if task["lastStatus"] == "RUNNING":
+                running[task_definition] += 1
+        for task_definition, count in tasks.most_common():
+            family, _, revision = task_definition.rpartition(":")
+            yield {
+                "title": TITLE_FORMAT.format(
+                    task_definition=task_definition,
+                    tasks=count,
+                    running=running[task_definition],
+                ),
+                "action": {
+                    "type": Actions.OPEN_URL,
+                    "url": TASK_DEFINITION_URL.format(
+                        family=family, revision=revision
+                    ),
+                },
+            }
 
     def cluster_url(self):
         return self.aws_console_base_url + "ecs/v2/clusters/{cluster_name}"
 
+    def inventory_options(self) -> Iterator[dict]:
+        return self.list_clusters(create_client("ecs", self.config))
+
     def list_clusters(self, client):
+        return self.cluster_options(
+            paginate(client, "list_clusters", "clusterArns")
+        )
+
+    def tagged_options(
+        self, resources: List["TaggedResource"]
+    ) -> Iterator[dict]:
+        # The tagging API lacks the cluster status
+        return self.cluster_options(resource.arn for resource in resources)
+
+    def cluster_options(self, cluster_arns: Iterable[str]) -> Iterator[dict]:
         CLUSTER_SERVICES_URL = (
             self.cluster_url() + f"/services?region={self.config.region}"
         )
 
         CLUSTER_TITLE_FORMAT = "{cluster_name} | {cluster_status}"
-        list_clusters_resp = client.list_clusters()
-        clusters = list_clusters_resp["clusterArns"]
-        while list_clusters_resp.get("nextToken") is not None:
-            clusters.extend(list_clusters_resp["clusterArns"])
-            list_clusters_resp = client.list_clusters()
-
-        described_clusters = client.describe_clusters(
-            clusters=clusters,
-        )["clusters"]
-
-        resp = []
-        for cluster_detail in described_clusters:
-            cluster_name = cluster_detail["clusterName"]
-            cluster_status = cluster_detail["status"]
-            resp.append(
-                {
+        for described in self.run_concurrently(
+            "ecs",
+            (
+                ("describe_clusters", {"clusters": chunk})
+                for chunk in chunked(cluster_arns, DESCRIBE_CLUSTERS_LIMIT)
+            ),
+        ):
+            for cluster_detail in described["clusters"]:
+                cluster_name = cluster_detail["clusterName"]
+                cluster_status = cluster_detail["status"]
+                yield {
                     "title": CLUSTER_TITLE_FORMAT.format(
                         cluster_name=cluster_name,
                         cluster_status=cluster_status,
@@ -127,5 +267,3 @@ class EcsCommand(AWSServiceCommand):
                         "value": cluster_name,
                     },
                 }
-            )
-        return resp
@@ -0,0 +1,111 @@
+import argparse
+import json
+import time
+from typing import List, TextIO
+
+from utils.aws import TAGGING_BACKEND, Config
+from utils.cache import describe_age, spawn_background_refresh
+from utils.inventory import InventoryIndex
+from utils.services import load_service_command
+from utils.slapdash import Actions
+
+
+def search_options(config: Config, query: str):
+    started_at = time.perf_counter()
+    index = InventoryIndex()
+    try:
+        matches = index.search(config.scope_key(), query)
+    finally:
+        index.close()
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    service_names = {}
+    options = [
+        {
+            "title": f"{len(matches)} matches for '{query}' "
+            f"in {elapsed_ms:.0f} ms",
+            "action": {"type": "copy", "value": query},
+        }
+    ]
+    for service_id, option in matches:
+        if service_id not in service_names:
+            service_names[service_id] = load_service_command(service_id)(
+                config
+            ).service_name()
+        # Drill-down params only make sense inside the service command
+        option.pop("moveAction", None)
+        option["title"] = f"{service_names[service_id]} | {option['title']}"
+        options.append(option)
+    return options
+
+
+def sync_options(args: argparse.Namespace, config: Config) -> List[dict]:
+    """
+    Keeps the index fed by the tagging API fresh, syncing right away
+    when it never was or a refresh is requested, in the background
+    once it is older than the `tagging` TTL.
+    """
+    from utils.tagging import last_synced, sync_inventory
+
+    synced_at = last_synced(config)
+    failed = []
+    if synced_at is None or args.refresh:
+        failed = sync_inventory(config)
+        synced_at = last_synced(config)
+    elif time.time() - synced_at > config.ttl_for(TAGGING_BACKEND):
+        spawn_background_refresh(args.argv)
+    refresh_param = {
+        "type": Actions.ADD_PARAM,
+        "name": "refresh",
+        "value": "true",
+    }
+    age = (
+        "never" if synced_at is None else describe_age(time.time() - synced_at)
+    )
+    options = [
+        {
+            "title": f"Refresh index (updated {age})",
+            "action": refresh_param,
+            "moveAction": refresh_param,
+        }
+    ]
+    for result in failed:
+        options.append(
+            {
+                "title": f"{result.label} | failed: {result.error}",
+                "action": {"type": Actions.COPY, "value": str(result.error)},
+            }
+        )
+    return options
+
+
+def serve_search_command(
+    arg_parser: argparse.ArgumentParser,
+    config: Config,
+    argv: List[str],
+    out: TextIO,
+):
+    args = arg_parser.parse_args(argv)
+    tagging = config.inventory_backend == TAGGING_BACKEND
+    if tagging and args.refresh_cache:
+        from utils.tagging import sync_inventory
+
+        sync_inventory(config)
+        return
+    if args.query:
+        options = sync_options(args, config) if tagging else []
+        options.extend(search_options(config, args.query))
+        view = {"type": "list", "options": options}
+    else:
+        view = {
+            "type": "form",
+            "title": "Search all services",
+            "submitLabel": "Search",
+            "fields": [
+                {
+                    "type": "text",
+                    "id": "query",
+                    "label": "Stack, table, instance, cluster or secret",
+                },
+            ],
+        }
+    print(json.dumps({"view": view}), file=out)
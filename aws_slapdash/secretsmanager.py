@@ -1,47 +1,90 @@
-import json
-from argparse import ArgumentParser
-from typing import Optional
+import threading
+import time
+from argparse import ArgumentParser, Namespace
+from typing import TYPE_CHECKING, Dict, Iterator, List, TextIO, Tuple
 
-from utils.slapdash import Actions
+from utils.aws import create_client
+from utils.chunks import chunked
+from utils.command import AWSServiceCommand
+from utils.paginate import paginate
+from utils.slapdash import (
+    Actions,
+    slapdash_show_message_and_exit,
+    write_action,
+    write_list_view,
+)
 
-from aws_slapdash.utils.aws import create_session
-from aws_slapdash.utils.command import AWSServiceCommand
+if TYPE_CHECKING:
+    from utils.tagging import TaggedResource
+
+COPY_ACTION = "copy"
+# batch_get_secret_value accepts at most 20 secret ids per call
+BATCH_GET_SECRETS_LIMIT = 20
+# Secret values are only ever kept in memory, for this long
+SECRET_VALUE_TTL = 60
+# Secret ARNs end with a dash and six random characters
+SECRET_ARN_SUFFIX = 7
+
+SecretKey = Tuple[str, str, bool, str]
+
+_secret_values: Dict[SecretKey, Tuple[str, float]] = {}
+# The daemon copies secrets from concurrent requests
+_secret_values_lock = threading.Lock()
 
 
 class SecretsManagerCommand(AWSServiceCommand):
+    service_id = "secretsmanager"
+    inventory_view = "secrets"
+
     def service_name(self):
         return "Secrets Manager"
 
     def service_url(self):
         return f"{self.aws_console_base_url}secretsmanager/secret"
 
-    def serve_command(self, arg_parser: ArgumentParser):
+    def serve_command(
+        self, arg_parser: ArgumentParser, argv: List[str], out: TextIO
+    ):
         arg_parser.add_argument(
             "--secret-name",
         )
-        args = arg_parser.parse_args()
-
-        print(
-            json.dumps(
-                {
-                    "view": {
-                        "type": "list",
-                        "options": self.serve_secrets_manager_command(
-                            args.secret_name
-                        ),
-                    }
-                }
-            )
+        arg_parser.add_argument(
+            "--secret-names",
+            help="Comma separated secrets to copy at once",
+        )
+        arg_parser.add_argument(
+            "--secret-action",
+            choices=[COPY_ACTION],
         )
+        args = arg_parser.parse_args(argv)
+
+        if args.secret_action == COPY_ACTION:
+            write_action(self.copy_secrets_action(args), out)
+            return
+        write_list_view(self.serve_secrets_manager_command(args), out)
 
-    def serve_secrets_manager_command(self, secret_name: Optional[str] = None):
-        session = create_session()
-        client = session.client("secretsmanager")
+    def serve_secrets_manager_command(self, args: Namespace):
+        secret_name = args.secret_name
         if not secret_name:
-            return self.get_list_secrets_view(client)
-        secret_value = client.get_secret_value(SecretId=secret_name)[
-            "SecretString"
-        ]
+            return self.cached_options(
+                args,
+                self.inventory_view,
+                lambda: self.fan_out_options(
+                    lambda command: command.inventory_options()
+                ),
+            )
+        command, secret_name = self.split_target(secret_name)
+        return command.secret_details(secret_name)
+
+    def secret_details(self, secret_name: str):
+        """
+        The value is only fetched once "Copy secret" is selected.
+        """
+        copy_param = {
+            "type": Actions.ADD_PARAM,
+            "name": "secret-action",
+            "value": COPY_ACTION,
+        }
         return [
             {
                 "title": "Copy secret name",
@@ -52,42 +95,151 @@ class SecretsManagerCommand(AWSServiceCommand):
             },
             {
                 "title": "Copy secret",
-                "action": {
-                    "type": Actions.COPY,
-                    "value": secret_value,
-                },
+                "action": copy_param,
+                "moveAction": copy_param,
             },
         ]
 
-    def get_list_secrets_view(self, client):
-        list_secrets_resp = client.list_secrets()
-        secrets = list_secrets_resp["SecretList"]
-        while list_secrets_resp.get("NextToken"):
-            list_secrets_resp = client.list_secrets(
-                NextToken=list_secrets_resp["NextToken"]
+    def copy_secrets_action(self, args: Namespace) -> dict:
+        """
+        Copies a single secret as is, several secrets as name=value lines.
+        """
+        if args.secret_names:
+            requested = args.secret_names.split(",")
+        elif args.secret_name:
+            requested = [args.secret_name]
+        else:
+            slapdash_show_message_and_exit("Select a secret to copy")
+        # Secrets are fetched together per profile and region
+        targets: Dict[Tuple[str, str], tuple] = {}
+        names = []
+        for value in requested:
+            command, secret_name = self.split_target(value)
+            target = (command.config.aws_profile, command.config.region)
+            targets.setdefault(target, (command, []))[1].append(secret_name)
+            names.append((target, secret_name))
+        values = {
+            (target, secret_name): value
+            for target, (command, secret_names) in targets.items()
+            for secret_name, value in command.secret_values(
+                secret_names
+            ).items()
+        }
+        if len(names) == 1:
+            value = values[names[0]]
+        else:
+            value = "\n".join(
+                f"{secret_name}={values[(target, secret_name)]}"
+                for target, secret_name in names
             )
-            secrets.extend(list_secrets_resp["SecretList"])
-        resp = []
+        return {"type": Actions.COPY, "value": value}
 
+    def secret_values(self, secret_names: List[str]) -> Dict[str, str]:
+        """
+        Values fetched in the last minute are reused,
+        so copying again from the daemon is instant.
+        """
+        now = time.time()
+        values = {}
+        missing = []
+        with _secret_values_lock:
+            for key, (_, expires_at) in list(_secret_values.items()):
+                if expires_at <= now:
+                    _secret_values.pop(key, None)
+            for secret_name in secret_names:
+                cached = _secret_values.get(self.secret_key(secret_name))
+                if cached is None:
+                    missing.append(secret_name)
+                else:
+                    values[secret_name] = cached[0]
+        if missing:
+            client = create_client("secretsmanager", self.config)
+            fetched = self.fetch_secret_values(client, missing)
+            expires_at = time.time() + SECRET_VALUE_TTL
+            with _secret_values_lock:
+                for secret_name, value in fetched.items():
+                    _secret_values[self.secret_key(secret_name)] = (
+                        value,
+                        expires_at,
+                    )
+            values.update(fetched)
+        return values
+
+    def secret_key(self, secret_name: str) -> SecretKey:
+        return (
+            self.config.aws_profile,
+            self.config.region,
+            self.config.aws_vault,
+            secret_name,
+        )
+
+    def fetch_secret_values(
+        self, client, secret_names: List[str]
+    ) -> Dict[str, str]:
+        """
+        Several secrets are fetched with batch_get_secret_value,
+        falling back to one call per secret on older botocore versions.
+        """
+        if len(secret_names) == 1 or not hasattr(
+            client, "batch_get_secret_value"
+        ):
+            return {
+                secret_name: client.get_secret_value(SecretId=secret_name)[
+                    "SecretString"
+                ]
+                for secret_name in secret_names
+            }
+        values = {}
+        for chunk in chunked(secret_names, BATCH_GET_SECRETS_LIMIT):
+            response = client.batch_get_secret_value(SecretIdList=chunk)
+            if response.get("Errors"):
+                slapdash_show_message_and_exit(
+                    "Could not get "
+                    + ", ".join(
+                        f"{error['SecretId']} ({error['ErrorCode']})"
+                        for error in response["Errors"]
+                    )
+                )
+            fetched = {}
+            for secret in response["SecretValues"]:
+                fetched[secret["Name"]] = secret["SecretString"]
+                fetched[secret["ARN"]] = secret["SecretString"]
+            for secret_name in chunk:
+                values[secret_name] = fetched[secret_name]
+        return values
+
+    def secret_option(self, name: str) -> dict:
         SECRET_DETAILS_URL = (
             self.aws_console_base_url
             + "/secretsmanager/secret?name={secret_name}"
         )
         TITLE_FORMAT = "{secret_name}"
-        for secret in secrets:
-            name = secret["Name"]
-            resp.append(
-                {
-                    "title": TITLE_FORMAT.format(secret_name=name),
-                    "action": {
-                        "type": "open-url",
-                        "url": SECRET_DETAILS_URL.format(secret_name=name),
-                    },
-                    "moveAction": {
-                        "type": "add-param",
-                        "name": "secret-name",
-                        "value": name,
-                    },
-                }
-            )
-        return resp
+        return {
+            "title": TITLE_FORMAT.format(secret_name=name),
+            "action": {
+                "type": "open-url",
+                "url": SECRET_DETAILS_URL.format(secret_name=name),
+            },
+            "moveAction": {
+                "type": "add-param",
+                "name": "secret-name",
+                "value": name,
+            },
+        }
+
+    def tagged_options(
+        self, resources: List["TaggedResource"]
+    ) -> Iterator[dict]:
+        for resource in resources:
+            # secret:<name>-<6 random characters>
+            resource_id = resource.resource_id.split(":", 1)[1]
+            yield self.secret_option(resource_id[:-SECRET_ARN_SUFFIX])
+
+    def inventory_options(self) -> Iterator[dict]:
+        return self.get_list_secrets_view(
+            create_client("secretsmanager", self.config)
+        )
+
+    def get_list_secrets_view(self, client):
+        for secret in paginate(client, "list_secrets", "SecretList"):
+            yield self.secret_option(secret["Name"])
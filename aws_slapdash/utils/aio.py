@@ -0,0 +1,198 @@
+"""
+Concurrent AWS calls on aiobotocore, when it is installed.
+
+Calls run as coroutines on one event loop thread per process, sharing a
+connection pool per client. Without aiobotocore they run on a thread pool
+with the regular boto3 clients instead.
+"""
+import asyncio
+import atexit
+import collections
+import importlib.util
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+from utils.aws import Config, create_client, create_session, get_config_path
+from utils.chunks import map_concurrently
+from utils.models import install_model_cache
+from utils.ratelimit import RETRIES, install_async_rate_limiter
+from utils.trace import Trace, activated, current
+
+# Name of the client method and its keyword arguments
+Call = Tuple[str, Dict[str, Any]]
+
+# Seconds to wait for the clients to close on exit
+CLOSE_TIMEOUT = 1
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+# Client, the credentials it was created with and its concurrency limit
+_async_clients: Dict[tuple, Tuple[Any, Any, asyncio.Semaphore]] = {}
+
+
+def async_backend_available() -> bool:
+    return importlib.util.find_spec("aiobotocore") is not None
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    """
+    The event loop of the process, kept alive with its clients
+    so the daemon reuses their connections across invocations.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+            atexit.register(close_clients)
+        return _loop
+
+
+async def close_async_clients():
+    for client, _, _ in _async_clients.values():
+        await client.close()
+    _async_clients.clear()
+
+
+def close_clients():
+    if _loop is not None:
+        asyncio.run_coroutine_threadsafe(close_async_clients(), _loop).result(
+            timeout=CLOSE_TIMEOUT
+        )
+
+
+async def async_client(
+    config: Config,
+    service_name: str,
+    credentials: Any,
+    max_concurrency: int,
+) -> Tuple[Any, asyncio.Semaphore]:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+
+    key = (config.aws_profile, config.region, config.aws_vault, service_name)
+    cached = _async_clients.get(key)
+    if cached is not None and cached[1] == credentials:
+        return cached[0], cached[2]
+    if cached is not None:
+        # The credentials were refreshed since the client was created
+        await cached[0].close()
+    session = get_session()
+    install_model_cache(session, get_config_path())
+    client_context = session.create_client(
+        service_name,
+        region_name=config.region,
+        aws_access_key_id=credentials.access_key,
+        aws_secret_access_key=credentials.secret_key,
+        aws_session_token=credentials.token,
+        config=AioConfig(
+            retries=RETRIES, max_pool_connections=max_concurrency
+        ),
+    )
+    # Kept open for the lifetime of the process, like the boto3 clients
+    client = await client_context.__aenter__()
+    install_async_rate_limiter(client, config, service_name)
+    # Every client talks to a single host, its semaphore limits that host
+    semaphore = asyncio.Semaphore(max_concurrency)
+    _async_clients[key] = (client, credentials, semaphore)
+    return client, semaphore
+
+
+async def async_call(
+    client: Any,
+    semaphore: asyncio.Semaphore,
+    call: Call,
+    trace: Optional[Trace],
+) -> dict:
+    operation_name, kwargs = call
+    # The loop's own context has no trace, the rate limiter records to it
+    with activated(trace):
+        async with semaphore:
+            started_at = time.perf_counter()
+            response = await getattr(client, operation_name)(**kwargs)
+    if trace is not None:
+        trace.record(
+            "call",
+            started_at,
+            time.perf_counter() - started_at,
+            operation=operation_name,
+        )
+    return response
+
+
+def run_async(
+    config: Config,
+    service_name: str,
+    calls: Iterable[Optional[Call]],
+    max_concurrency: int,
+) -> Iterator[Optional[dict]]:
+    credentials = (
+        create_session(config).get_credentials().get_frozen_credentials()
+    )
+    loop = event_loop()
+    client, semaphore = asyncio.run_coroutine_threadsafe(
+        async_client(config, service_name, credentials, max_concurrency),
+        loop,
+    ).result()
+    trace = current()
+    in_flight: Deque[Optional[Future]] = collections.deque()
+    for call in calls:
+        in_flight.append(
+            None
+            if call is None
+            else asyncio.run_coroutine_threadsafe(
+                async_call(client, semaphore, call, trace), loop
+            )
+        )
+        # Keeps the calls lazy while the semaphore is kept busy
+        if len(in_flight) >= max_concurrency * 2:
+            future = in_flight.popleft()
+            yield None if future is None else future.result()
+    while in_flight:
+        future = in_flight.popleft()
+        yield None if future is None else future.result()
+
+
+def run_threaded(
+    config: Config,
+    service_name: str,
+    calls: Iterable[Optional[Call]],
+    max_concurrency: int,
+) -> Iterator[Optional[dict]]:
+    client = create_client(service_name, config)
+    trace = current()
+
+    def run_call(call: Optional[Call]) -> Optional[dict]:
+        if call is None:
+            return None
+        operation_name, kwargs = call
+        started_at = time.perf_counter()
+        response = getattr(client, operation_name)(**kwargs)
+        if trace is not None:
+            trace.record(
+                "call",
+                started_at,
+                time.perf_counter() - started_at,
+                operation=operation_name,
+            )
+        return response
+
+    return map_concurrently(run_call, calls, max_workers=max_concurrency)
+
+
+def run_concurrently(
+    config: Config,
+    service_name: str,
+    calls: Iterable[Optional[Call]],
+    max_concurrency: int,
+) -> Iterator[Optional[dict]]:
+    """
+    Runs the calls with at most `max_concurrency` in flight,
+    yielding the responses in order.
+    A None call yields None, which keeps cached results in place.
+    """
+    if async_backend_available():
+        return run_async(config, service_name, calls, max_concurrency)
+    return run_threaded(config, service_name, calls, max_concurrency)
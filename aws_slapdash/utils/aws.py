@@ -1,10 +1,45 @@
 import dataclasses
 import json
 import os
-import subprocess
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
-import boto3
-from utils.slapdash import slapdash_show_message_and_exit
+from utils.credentials import EXPIRY_MARGIN, CredentialsCache
+from utils.models import install_model_cache
+from utils.trace import span
+
+if TYPE_CHECKING:
+    import boto3
+
+DEFAULT_CACHE_TTL = 300
+DEFAULT_FANOUT_TIMEOUT = 10.0
+DEFAULT_FANOUT_WORKERS = 8
+DEFAULT_MAX_RESULTS = 200
+DEFAULT_PREFETCH_COUNT = 3
+# Seconds a list view waits for live results before rendering what it has
+DEFAULT_RENDER_DEADLINE = 1.5
+# Search index fed by the listings of every service as they are fetched
+DEFAULT_INVENTORY_BACKEND = "listers"
+# Search index synced from the Resource Groups Tagging API
+TAGGING_BACKEND = "tagging"
+
+# Error codes AWS returns to throttled callers, as botocore retries them
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "TransactionInProgressException",
+    "RequestLimitExceeded",
+    "BandwidthLimitExceeded",
+    "LimitExceededException",
+    "RequestThrottled",
+    "SlowDown",
+    "PriorRequestNotComplete",
+    "EC2ThrottledException",
+}
 
 
 @dataclasses.dataclass
@@ -12,57 +47,183 @@ class Config:
     aws_profile: str
     region: str
     aws_vault: bool
+    cache_ttl: Dict[str, int] = dataclasses.field(default_factory=dict)
+    # All profiles and regions list views fan out to,
+    # aws_profile and region are the first of them
+    aws_profiles: List[str] = dataclasses.field(default_factory=list)
+    regions: List[str] = dataclasses.field(default_factory=list)
+    fanout_timeout: float = DEFAULT_FANOUT_TIMEOUT
+    fanout_workers: int = DEFAULT_FANOUT_WORKERS
+    # Lists ranked against a query return at most this many options at once
+    max_results: int = DEFAULT_MAX_RESULTS
+    # Most opened resources whose drill-down views are prefetched
+    prefetch_count: int = DEFAULT_PREFETCH_COUNT
+    inventory_backend: str = DEFAULT_INVENTORY_BACKEND
+    # Whether the daemon keeps the listings fresh on their own schedule
+    background_sync: bool = False
+    # 0 waits for the complete listing
+    render_deadline: float = DEFAULT_RENDER_DEADLINE
 
+    def ttl_for(self, service_id: str) -> int:
+        return self.cache_ttl.get(
+            service_id, self.cache_ttl.get("default", DEFAULT_CACHE_TTL)
+        )
 
-def load_config() -> Config:
-    config_path = os.path.join(
+    def targets(self) -> List["Config"]:
+        """
+        One config for every profile and region combination.
+        """
+        return [
+            self.for_target(profile, region)
+            for profile in self.aws_profiles or [self.aws_profile]
+            for region in self.regions or [self.region]
+        ]
+
+    def scope_key(self) -> str:
+        profiles = self.aws_profiles or [self.aws_profile]
+        regions = self.regions or [self.region]
+        return f"{','.join(profiles)}|{','.join(regions)}"
+
+    def for_target(self, profile: str, region: str) -> "Config":
+        return dataclasses.replace(
+            self,
+            aws_profile=profile,
+            region=region,
+            aws_profiles=[profile],
+            regions=[region],
+        )
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return False
+    return response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+def as_list(value: Union[str, List[str]]) -> List[str]:
+    return value if isinstance(value, list) else [value]
+
+
+SessionKey = Tuple[str, str, bool]
+
+_sessions: Dict[SessionKey, Tuple["boto3.Session", float]] = {}
+_clients: Dict[SessionKey, Dict[str, Any]] = {}
+
+
+def get_config_path():
+    return os.path.join(
         os.environ.get("APPDATA")
         or os.environ.get("XDG_CONFIG_HOME")
         or os.path.join(os.environ["HOME"], ".config"),
         "aws_slapdash",
     )
+
+
+def load_config() -> Config:
+    config_path = get_config_path()
     with open(os.path.join(config_path, "config.json")) as json_file:
         config_source = json.load(json_file)
+        profiles = as_list(config_source["profile"])
+        regions = as_list(config_source["region"])
         config = Config(
-            aws_profile=config_source["profile"],
-            region=config_source["region"],
+            aws_profile=profiles[0],
+            region=regions[0],
             aws_vault=config_source["awsVault"],
+            cache_ttl=config_source.get("cacheTtl", {}),
+            aws_profiles=profiles,
+            regions=regions,
+            fanout_timeout=config_source.get(
+                "fanoutTimeout", DEFAULT_FANOUT_TIMEOUT
+            ),
+            fanout_workers=config_source.get(
+                "fanoutWorkers", DEFAULT_FANOUT_WORKERS
+            ),
+            max_results=config_source.get("maxResults", DEFAULT_MAX_RESULTS),
+            prefetch_count=config_source.get(
+                "prefetchCount", DEFAULT_PREFETCH_COUNT
+            ),
+            inventory_backend=config_source.get(
+                "inventoryBackend", DEFAULT_INVENTORY_BACKEND
+            ),
+            background_sync=config_source.get("backgroundSync", False),
+            render_deadline=config_source.get(
+                "renderDeadline", DEFAULT_RENDER_DEADLINE
+            ),
         )
         return config
 
 
-def create_session(config: Config = load_config()) -> boto3.session.Session:
-    envvars = subprocess.check_output(
-        ["aws-vault", "exec", config.aws_profile, "--", "env"]
-    )
-    aws_access_key_id = None
-    aws_secret_access_key = None
-    aws_session_token = None
-    for envline in envvars.split(b"\n"):
-        line = envline.decode("utf8")
-        eqpos = line.find("=")
-        if eqpos < 4:
-            continue
-        k = line[0:eqpos]
-        v = line[eqpos + 1 :]
-        if k == "AWS_ACCESS_KEY_ID":
-            aws_access_key_id = v
-        if k == "AWS_SECRET_ACCESS_KEY":
-            aws_secret_access_key = v
-        if k == "AWS_SESSION_TOKEN":
-            aws_session_token = v
-    if (
-        aws_session_token is None
-        or aws_secret_access_key is None
-        or aws_access_key_id is None
-    ):
-        slapdash_show_message_and_exit(
-            f"could not authenticate with aws-vault, response: {envvars}"
+def create_session(config: Optional[Config] = None) -> "boto3.Session":
+    """
+    Sessions are kept for the lifetime of the process,
+    which lets the daemon reuse them across invocations.
+    """
+    # boto3 takes a few hundred milliseconds to import,
+    # only pay for it when AWS is actually called
+    with span("import boto3"):
+        import boto3
+
+    if config is None:
+        config = load_config()
+    session_key = (config.aws_profile, config.region, config.aws_vault)
+    cached = _sessions.get(session_key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+    if not config.aws_vault:
+        session = boto3.Session(
+            profile_name=config.aws_profile or None,
+            region_name=config.region,
+        )
+        # boto3 refreshes credentials of named profiles by itself
+        expiration = float("inf")
+    else:
+        with span("aws-vault credentials", profile=config.aws_profile):
+            credentials = CredentialsCache(
+                get_config_path()
+            ).aws_vault_credentials(config.aws_profile)
+        session = boto3.Session(
+            credentials.access_key_id,
+            credentials.secret_access_key,
+            credentials.session_token,
+            config.region,
         )
+        expiration = credentials.expiration - EXPIRY_MARGIN
+    install_model_cache(session._session, get_config_path())
+    _sessions[session_key] = (session, expiration)
+    _clients.pop(session_key, None)
+    return session
+
 
-    return boto3.Session(
-        aws_access_key_id,
-        aws_secret_access_key,
-        aws_session_token,
-        config.region,
+def create_client(service_name: str, config: Optional[Config] = None):
+    """
+    Clients are pooled per service, keeping their HTTPS connections alive.
+    They retry in adaptive mode and share a rate limit per service.
+    """
+    if config is None:
+        config = load_config()
+    session = create_session(config)
+    session_clients = _clients.setdefault(
+        (config.aws_profile, config.region, config.aws_vault), {}
     )
+    client = session_clients.get(service_name)
+    if client is None:
+        from botocore.config import Config as ClientConfig
+
+        from utils.ratelimit import (
+            RETRIES,
+            install_rate_limiter,
+            pool_connections,
+        )
+
+        with span("create client", service=service_name):
+            client = session.client(
+                service_name,
+                config=ClientConfig(
+                    retries=RETRIES,
+                    max_pool_connections=pool_connections(config),
+                ),
+            )
+        install_rate_limiter(client, config, service_name)
+        session_clients[service_name] = client
+    return client
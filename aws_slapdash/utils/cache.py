@@ -0,0 +1,210 @@
+import atexit
+import contextlib
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Set
+
+from utils.aws import Config, get_config_path
+from utils.filelock import locked_within
+
+REFRESH_CACHE_FLAG = "--refresh-cache"
+PREFETCH_FLAG = "--prefetch"
+# Background runs start aws.py, also for commands the daemon served
+AWS_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "aws.py"
+)
+
+# Temporary files of the entries being written
+_writing: Set[str] = set()
+
+
+@atexit.register
+def remove_partial_entries():
+    """
+    A listing cut short by the render deadline is still being written by
+    a daemon thread when the process exits, its file is removed here.
+    """
+    for tmp_path in list(_writing):
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    path: str
+    created_at: float
+    # Identifies the state of the resource the entry was rendered from
+    version: Optional[str] = None
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+    @property
+    def stored_at(self) -> float:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return 0.0
+
+    def options(self) -> Iterator[dict]:
+        """
+        Reads the options one line at a time,
+        so large listings are never fully loaded in memory.
+        """
+        with open(self.path) as cache_file:
+            next(cache_file)
+            for line in cache_file:
+                yield json.loads(line)
+
+
+class ViewCache:
+    """
+    Rendered option lists stored on disk,
+    keyed by profile, region, service and view.
+
+    Entries are JSON lines: a header with the key and creation time,
+    followed by one option per line.
+    """
+
+    def __init__(self, config: Config, service_id: str):
+        self.config = config
+        self.service_id = service_id
+
+    @property
+    def cache_dir(self) -> str:
+        return os.path.join(get_config_path(), "cache")
+
+    def cache_key(self, view: str) -> str:
+        return "|".join([self.config.scope_key(), self.service_id, view])
+
+    def path(self, view: str) -> str:
+        digest = hashlib.sha256(self.cache_key(view).encode()).hexdigest()
+        file_name = f"{self.service_id}-{digest}.jsonl"
+        return os.path.join(self.cache_dir, file_name)
+
+    def load(self, view: str) -> Optional[CacheEntry]:
+        cache_file_path = self.path(view)
+        try:
+            with open(cache_file_path) as cache_file:
+                header = json.loads(cache_file.readline())
+        except (OSError, ValueError):
+            return None
+        if header.get("key") != self.cache_key(view):
+            return None
+        return CacheEntry(
+            cache_file_path, header["createdAt"], header.get("version")
+        )
+
+    @contextlib.contextmanager
+    def single_flight(
+        self, view: str, timeout: float
+    ) -> Iterator[Optional[CacheEntry]]:
+        """
+        Lets one process at a time fetch the view, the others wait for it
+        up to `timeout` seconds. Yields the entry another process stored
+        meanwhile, or None when the caller should fetch it.
+        """
+        requested_at = time.time()
+        with locked_within(self.path(view) + ".lock", timeout):
+            entry = self.load(view)
+            # Written while waiting, by a fetch that may have started before
+            if entry is not None and entry.stored_at >= requested_at:
+                yield entry
+            else:
+                yield None
+
+    def store(
+        self,
+        view: str,
+        options: Iterable[dict],
+        version: Optional[str] = None,
+        complete: Optional[Callable[[], bool]] = None,
+    ) -> Iterator[dict]:
+        """
+        Writes the options to the cache while passing them through.
+        The entry only replaces the previous one once all options are
+        consumed, an interrupted listing leaves the cache untouched.
+        So does a listing `complete` rejects once it is consumed.
+        """
+        pathlib.Path(self.cache_dir).mkdir(parents=True, exist_ok=True)
+        cache_file_path = self.path(view)
+        # Write to a temporary file first so readers never see partial JSON
+        # The daemon may store the same view from two threads
+        tmp_path = (
+            f"{cache_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        _writing.add(tmp_path)
+        try:
+            with open(tmp_path, "w") as cache_file:
+                header = {
+                    "key": self.cache_key(view),
+                    "createdAt": time.time(),
+                    "version": version,
+                }
+                cache_file.write(json.dumps(header) + "\n")
+                for option in options:
+                    cache_file.write(json.dumps(option) + "\n")
+                    yield option
+            if complete is None or complete():
+                os.replace(tmp_path, cache_file_path)
+        finally:
+            _writing.discard(tmp_path)
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+def spawn_background_refresh(argv: List[str]) -> None:
+    """
+    Re-runs the command line of the current command detached from Slapdash,
+    so the cache is refreshed without delaying the view.
+    """
+    if REFRESH_CACHE_FLAG in argv:
+        return
+    subprocess.Popen(
+        [sys.executable, AWS_SCRIPT, *argv, REFRESH_CACHE_FLAG, "true"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        start_new_session=True,
+    )
+
+
+def spawn_prefetch(service_id: str) -> None:
+    """
+    Warms the drill-down views of the most opened resources of the service
+    in a detached process.
+    """
+    subprocess.Popen(
+        [
+            sys.executable,
+            AWS_SCRIPT,
+            "--service-name",
+            service_id,
+            PREFETCH_FLAG,
+            "true",
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        start_new_session=True,
+    )
+
+
+def describe_age(seconds: float) -> str:
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} h ago"
+    return f"{int(seconds // 86400)} d ago"
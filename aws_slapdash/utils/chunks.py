@@ -0,0 +1,58 @@
+import collections
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, List, TypeVar
+
+from utils.trace import in_current_context
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_WORKERS = 8
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def map_chunks(
+    call: Callable[[List[T]], R],
+    items: Iterable[T],
+    size: int,
+    max_workers: int = DEFAULT_WORKERS,
+) -> Iterator[R]:
+    """
+    Calls `call` for every chunk of at most `size` items, concurrently,
+    and yields the results in order.
+
+    Items are consumed lazily, so chunks of a paginated listing are
+    described while the next pages are still being fetched.
+    """
+    # Calls are traced as part of the invocation that made them
+    call = in_current_context(call)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight: Deque = collections.deque()
+        for chunk in chunked(items, size):
+            in_flight.append(executor.submit(call, chunk))
+            if len(in_flight) >= max_workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def map_concurrently(
+    call: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = DEFAULT_WORKERS,
+) -> Iterator[R]:
+    """
+    Calls `call` for every item on a bounded pool, yielding results in order.
+    """
+    return map_chunks(
+        lambda chunk: call(chunk[0]), items, 1, max_workers=max_workers
+    )
@@ -1,10 +1,67 @@
 from abc import ABCMeta, abstractmethod
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
 
 from utils.aws import Config
+from utils.cache import (
+    ViewCache,
+    describe_age,
+    spawn_background_refresh,
+    spawn_prefetch,
+)
+from utils.deadline import DeadlineStream
+from utils.fanout import TargetResult, fan_out
+from utils.fuzzy import rank
+from utils.inventory import InventoryIndex
+from utils.selections import SelectionLog
+from utils.slapdash import Actions, started
+
+if TYPE_CHECKING:
+    from utils.tagging import TaggedResource
+
+# Joins a resource with its profile and region in drill-down params
+TARGET_SEPARATOR = "|"
+
+
+def refresh_option(age: float) -> dict:
+    refresh_param = {
+        "type": Actions.ADD_PARAM,
+        "name": "refresh",
+        "value": "true",
+    }
+    return {
+        "title": f"Refresh (updated {describe_age(age)})",
+        "action": refresh_param,
+        "moveAction": refresh_param,
+    }
+
+
+class FailedTargetOption(dict):
+    """
+    Lists a profile and region whose listing failed. It is rendered with
+    the other options but never cached or indexed as a resource.
+    """
 
 
 class AWSServiceCommand(metaclass=ABCMeta):
+    # Key of the command in the service table, used for caching
+    service_id = ""
+    # The cached view listing all resources, it feeds the search index
+    inventory_view = ""
+    # Param the options of the list view open a resource with
+    drilldown_param = ""
+
     def __init__(self, config: Config):
         self.config = config
 
@@ -13,7 +70,12 @@ class AWSServiceCommand(metaclass=ABCMeta):
         raise NotImplementedError
 
     @abstractmethod
-    def serve_command(self, arg_parser: ArgumentParser):
+    def serve_command(
+        self, arg_parser: ArgumentParser, argv: List[str], out: TextIO
+    ):
+        """
+        Serves the command line `argv` of one request, writing to `out`.
+        """
         raise NotImplementedError
 
     @abstractmethod
@@ -23,3 +85,350 @@ class AWSServiceCommand(metaclass=ABCMeta):
     @property
     def aws_console_base_url(self) -> str:
         return f"https://{self.config.region}.console.aws.amazon.com/"
+
+    def cached_options(
+        self,
+        args: Namespace,
+        view: str,
+        fetch: Callable[[], Iterable[dict]],
+    ) -> Iterator[dict]:
+        """
+        Serves the view from the on disk cache when possible.
+        Stale entries are returned as is and refreshed in the background.
+
+        Without a query param every option is rendered, Slapdash filters
+        them itself. With one, options are ranked against it and capped to
+        the limit, so the view stays small however many resources the
+        account has.
+
+        Live listings render what arrived within the render deadline,
+        the rest is fetched into the cache in the background.
+        When several processes fetch the same view at once, only one calls
+        AWS and the others wait to serve what it stored.
+        """
+        cache = ViewCache(self.config, self.service_id)
+        if args.refresh_cache:
+            with cache.single_flight(
+                view, self.config.fanout_timeout
+            ) as stored:
+                # Skipped when another process just refreshed the view
+                if stored is None:
+                    for _ in self.store_options(cache, view, fetch()):
+                        pass
+            return
+        entry = cache.load(view)
+        if entry is not None and not args.refresh:
+            if entry.age > self.config.ttl_for(self.service_id):
+                spawn_background_refresh(args.argv)
+            yield from self.render_options(args, entry.options(), entry.age)
+            return
+        with cache.single_flight(view, self.flight_timeout()) as stored:
+            if stored is not None:
+                yield from self.render_options(
+                    args, stored.options(), stored.age
+                )
+                return
+            options = self.store_options(cache, view, fetch())
+            live = None
+            if self.config.render_deadline > 0:
+                options = live = DeadlineStream(
+                    options, self.config.render_deadline
+                )
+            yield from self.render_options(args, options, 0.0, live)
+
+    def flight_timeout(self) -> float:
+        """
+        How long to wait for another process fetching the same view.
+        """
+        return self.config.render_deadline or self.config.fanout_timeout
+
+    def render_options(
+        self,
+        args: Namespace,
+        options: Iterable[dict],
+        age: float,
+        live: Optional[DeadlineStream] = None,
+    ) -> Iterator[dict]:
+        # Started before the Refresh option is yielded
+        options = started(options)
+        yield refresh_option(age)
+        limit = self.view_limit(args)
+        matches = yield from rank(
+            options, args.query or "", limit, self.resource_title
+        )
+        if live is not None and live.expired:
+            # The cut short listing is left out of the cache,
+            # the background run stores it complete for the next open
+            spawn_background_refresh(args.argv)
+            reload_param = {
+                "type": Actions.ADD_PARAM,
+                "name": "limit",
+                # 0 keeps an unranked list uncapped
+                "value": str(limit or 0),
+            }
+            yield {
+                "title": "Results incomplete, loading more in the background",
+                "action": reload_param,
+                "moveAction": reload_param,
+            }
+            return
+        if limit is not None and matches > limit:
+            show_more_param = {
+                "type": Actions.ADD_PARAM,
+                "name": "limit",
+                "value": str(limit * 2),
+            }
+            yield {
+                "title": f"Show more ({limit} of {matches} shown)",
+                "action": show_more_param,
+                "moveAction": show_more_param,
+            }
+        # The list is rendered by now, the next step is opening one entry
+        if (
+            self.stale_selections()
+            and SelectionLog(self.config, self.service_id).claim_prefetch()
+        ):
+            spawn_prefetch(self.service_id)
+
+    def view_limit(self, args: Namespace) -> Optional[int]:
+        """
+        How many options a list view renders, None for all of them.
+        """
+        if args.limit:
+            return args.limit
+        if args.query:
+            return self.config.max_results
+        return None
+
+    def resource_title(self, option: dict) -> str:
+        """
+        The title without the profile and region prefix of listings
+        fanned out to several targets, options are ranked by it.
+        """
+        if len(self.config.targets()) == 1:
+            return option["title"]
+        return option["title"].split(" | ", 1)[-1]
+
+    def cached_details(
+        self,
+        view: str,
+        refresh: bool,
+        fetch: Callable[[], Iterable[dict]],
+    ) -> Iterator[dict]:
+        """
+        Serves a drill-down view from the cache while it is within the TTL,
+        which is how prefetched views are picked up.
+        Concurrent fetches of the same view are left to a single process.
+        """
+        cache = ViewCache(self.config, self.service_id)
+        entry = cache.load(view)
+        if (
+            entry is None
+            or refresh
+            or entry.age > self.config.ttl_for(self.service_id)
+        ):
+            with cache.single_flight(view, self.flight_timeout()) as stored:
+                if stored is None:
+                    yield from cache.store(view, fetch())
+                    yield refresh_option(0.0)
+                    return
+            entry = stored
+        yield from entry.options()
+        yield refresh_option(entry.age)
+
+    def details_cached(self, view: str) -> bool:
+        entry = ViewCache(self.config, self.service_id).load(view)
+        return entry is not None and entry.age <= self.config.ttl_for(
+            self.service_id
+        )
+
+    def record_selection(self, args: Namespace, value: str):
+        """
+        Counts a drill-down opened by the user. Background runs and
+        refreshing an open drill-down are not counted.
+        """
+        if not args.refresh_cache and not args.refresh:
+            SelectionLog(self.config, self.service_id).record(value)
+
+    def inventory_options(self) -> Iterable[dict]:
+        """
+        Options of the inventory view for the command's profile and region.
+        """
+        raise NotImplementedError
+
+    def refresh_inventory(self) -> List[TargetResult]:
+        """
+        Fetches the inventory view into the cache,
+        returning the profiles and regions that failed.
+        """
+        failed: List[TargetResult] = []
+        for _ in self.store_options(
+            ViewCache(self.config, self.service_id),
+            self.inventory_view,
+            self.fan_out_options(
+                lambda command: command.inventory_options(), failed.append
+            ),
+        ):
+            pass
+        return failed
+
+    def tagged_options(
+        self, resources: List["TaggedResource"]
+    ) -> Iterator[dict]:
+        """
+        Inventory options of the resources the tagging API listed,
+        as the inventory view lists them.
+        """
+        raise NotImplementedError
+
+    def drilldown_cached(self, resource: str) -> bool:
+        """
+        Whether the drill-down view of the resource can be served
+        without calling AWS.
+        """
+        return True
+
+    def prefetch_drilldown(self, resource: str):
+        """
+        Fetches the drill-down view of the resource into the cache.
+        """
+
+    def stale_selections(self) -> List[str]:
+        """
+        The most opened resources whose drill-down views aren't cached.
+        """
+        if not self.drilldown_param or self.config.prefetch_count <= 0:
+            return []
+        stale = []
+        for value in SelectionLog(self.config, self.service_id).top(
+            self.config.prefetch_count
+        ):
+            command, resource = self.split_target(value)
+            if not command.drilldown_cached(resource):
+                stale.append(value)
+        return stale
+
+    def prefetch_drilldowns(self):
+        for value in self.stale_selections():
+            command, resource = self.split_target(value)
+            try:
+                command.prefetch_drilldown(resource)
+            except Exception:
+                # A deleted resource must not keep the others from loading,
+                # nor be fetched again on every list
+                SelectionLog(self.config, self.service_id).record_failure(
+                    value
+                )
+
+    def store_options(
+        self, cache: ViewCache, view: str, options: Iterable[dict]
+    ) -> Iterator[dict]:
+        """
+        Streams a fresh listing into the cache,
+        then updates the search index from the stored entry.
+
+        Failed profiles and regions are rendered after the stored options.
+        A listing with failures is not stored, so the next open fetches
+        it again instead of serving the gap for the whole TTL.
+        """
+        failed: List[dict] = []
+
+        def listed() -> Iterator[dict]:
+            for option in options:
+                if isinstance(option, FailedTargetOption):
+                    failed.append(option)
+                else:
+                    yield option
+
+        yield from cache.store(view, listed(), complete=lambda: not failed)
+        yield from failed
+        entry = cache.load(view)
+        if failed or view != self.inventory_view or entry is None:
+            return
+        index = InventoryIndex()
+        try:
+            index.replace(
+                self.config.scope_key(), self.service_id, entry.options()
+            )
+        finally:
+            index.close()
+
+    def fan_out_options(
+        self,
+        fetch: Callable[["AWSServiceCommand"], Iterable[dict]],
+        on_error: Optional[Callable[[TargetResult], None]] = None,
+    ) -> Iterator[dict]:
+        """
+        Runs a list view for every configured profile and region.
+        Titles are prefixed with the profile and region they came from,
+        and failing targets are listed instead of failing the whole view.
+        """
+        targets = self.config.targets()
+        if len(targets) == 1:
+            yield from fetch(self)
+            return
+        for result in fan_out(
+            targets,
+            lambda target: list(fetch(type(self)(target))),
+            self.config.fanout_workers,
+            self.config.fanout_timeout,
+        ):
+            if result.error is not None:
+                if on_error is not None:
+                    on_error(result)
+                yield FailedTargetOption(
+                    title=f"{result.label} | failed: {result.error}",
+                    action={
+                        "type": Actions.COPY,
+                        "value": str(result.error),
+                    },
+                )
+                continue
+            for option in result.options:
+                option = {
+                    **option,
+                    "title": f"{result.label} | {option['title']}",
+                }
+                move_action = option.get("moveAction")
+                if move_action and move_action["type"] == Actions.ADD_PARAM:
+                    option["moveAction"] = {
+                        **move_action,
+                        "value": TARGET_SEPARATOR.join(
+                            [
+                                move_action["value"],
+                                result.config.aws_profile,
+                                result.config.region,
+                            ]
+                        ),
+                    }
+                yield option
+
+    def run_concurrently(
+        self,
+        service_name: str,
+        calls: Iterable[Optional[Tuple[str, Dict[str, Any]]]],
+    ) -> Iterator[Optional[dict]]:
+        """
+        Runs (operation name, kwargs) calls of the service concurrently,
+        yielding the responses in order. A None call yields None.
+
+        Calls run as coroutines when aiobotocore is installed,
+        otherwise on a thread pool.
+        """
+        # asyncio is only imported by the views that fan out
+        from utils.aio import run_concurrently
+
+        return run_concurrently(
+            self.config, service_name, calls, self.config.fanout_workers
+        )
+
+    def split_target(self, value: str) -> Tuple["AWSServiceCommand", str]:
+        """
+        Returns the command for the profile and region a drill-down param
+        was listed from, along with the resource itself.
+        """
+        parts = value.split(TARGET_SEPARATOR)
+        if len(parts) != 3:
+            return self, value
+        resource, profile, region = parts
+        return type(self)(self.config.for_target(profile, region)), resource
@@ -0,0 +1,118 @@
+import dataclasses
+import datetime
+import json
+import os
+import subprocess
+import time
+from typing import Dict, Optional
+
+from utils.filelock import locked
+from utils.slapdash import slapdash_show_message_and_exit
+
+# Credentials are refreshed this many seconds before they expire
+EXPIRY_MARGIN = 300
+# aws-vault does not always report the expiry, assume a short lifetime then
+DEFAULT_LIFETIME = 900
+
+
+@dataclasses.dataclass
+class Credentials:
+    access_key_id: str
+    secret_access_key: str
+    session_token: str
+    expiration: float
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.expiration - EXPIRY_MARGIN > time.time()
+
+
+def parse_expiration(value: str) -> float:
+    return datetime.datetime.fromisoformat(
+        value.replace("Z", "+00:00")
+    ).timestamp()
+
+
+def parse_aws_vault_env(envvars: bytes) -> Optional[Credentials]:
+    values: Dict[str, str] = {}
+    for envline in envvars.split(b"\n"):
+        line = envline.decode("utf8")
+        eqpos = line.find("=")
+        if eqpos < 4:
+            continue
+        values[line[0:eqpos]] = line[eqpos + 1 :]
+    if not (
+        values.get("AWS_ACCESS_KEY_ID")
+        and values.get("AWS_SECRET_ACCESS_KEY")
+        and values.get("AWS_SESSION_TOKEN")
+    ):
+        return None
+    expiration = values.get("AWS_CREDENTIAL_EXPIRATION") or values.get(
+        "AWS_SESSION_EXPIRATION"
+    )
+    return Credentials(
+        access_key_id=values["AWS_ACCESS_KEY_ID"],
+        secret_access_key=values["AWS_SECRET_ACCESS_KEY"],
+        session_token=values["AWS_SESSION_TOKEN"],
+        expiration=(
+            parse_expiration(expiration)
+            if expiration
+            else time.time() + DEFAULT_LIFETIME
+        ),
+    )
+
+
+class CredentialsCache:
+    """
+    Temporary credentials per profile, stored in a file only readable
+    by the current user.
+    """
+
+    def __init__(self, config_path: str):
+        self.path = os.path.join(config_path, "credentials.json")
+        self.lock_path = os.path.join(config_path, "credentials.lock")
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, profile: str) -> Optional[Credentials]:
+        cached = self._read().get(profile)
+        if cached is None:
+            return None
+        credentials = Credentials(**cached)
+        return credentials if credentials.is_fresh else None
+
+    def store(self, profile: str, credentials: Credentials) -> None:
+        cached = {
+            cached_profile: value
+            for cached_profile, value in self._read().items()
+            if Credentials(**value).is_fresh
+        }
+        cached[profile] = dataclasses.asdict(credentials)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump(cached, cache_file)
+        os.replace(tmp_path, self.path)
+
+    def aws_vault_credentials(self, profile: str) -> Credentials:
+        # The lock makes concurrent invocations wait for a single aws-vault
+        with locked(self.lock_path):
+            credentials = self.load(profile)
+            if credentials is not None:
+                return credentials
+            envvars = subprocess.check_output(
+                ["aws-vault", "exec", profile, "--", "env"]
+            )
+            credentials = parse_aws_vault_env(envvars)
+            if credentials is None:
+                slapdash_show_message_and_exit(
+                    "could not authenticate with aws-vault, "
+                    f"response: {envvars}"
+                )
+            self.store(profile, credentials)
+            return credentials
@@ -0,0 +1,46 @@
+"""
+Client side of the daemon protocol.
+
+Only depends on the standard library so it can run before anything heavy
+is imported.
+"""
+import json
+import os
+import socket
+from typing import List, Optional
+
+SOCKET_NAME = "daemon.sock"
+CONNECT_TIMEOUT = 0.2
+RESPONSE_TIMEOUT = 60
+
+
+def daemon_socket_path(config_path: str) -> str:
+    return os.path.join(config_path, SOCKET_NAME)
+
+
+def forward_to_daemon(config_path: str, argv: List[str]) -> Optional[str]:
+    """
+    Sends argv to a running daemon and returns the rendered view,
+    or None when there is no daemon to talk to.
+    """
+    path = daemon_socket_path(config_path)
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(path)
+            sock.settimeout(RESPONSE_TIMEOUT)
+            sock.sendall(json.dumps({"argv": argv}).encode() + b"\n")
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError:
+        return None
+    if not chunks:
+        return None
+    return b"".join(chunks).decode("utf8")
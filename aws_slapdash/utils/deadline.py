@@ -0,0 +1,70 @@
+import queue
+import threading
+import time
+from typing import Any, Iterable, Iterator, Optional
+
+from utils.trace import in_current_context
+
+
+class _Done:
+    """
+    Marks the end of the items in the queue.
+    """
+
+    def __init__(self, error: Optional[BaseException]):
+        self.error = error
+
+
+class DeadlineStream:
+    """
+    Iterates over items produced on a worker thread until the deadline,
+    so a slow page never holds up rendering the items that already arrived.
+
+    `expired` tells whether the items were cut short.
+    """
+
+    def __init__(self, items: Iterable[Any], seconds: float):
+        self.items = items
+        self.deadline = time.monotonic() + seconds
+        self.expired = False
+        self._stopped = threading.Event()
+
+    def produce(self, items: "queue.Queue"):
+        iterator = iter(self.items)
+        error: Optional[BaseException] = None
+        try:
+            for item in iterator:
+                if self._stopped.is_set():
+                    break
+                items.put(item)
+        except Exception as e:
+            error = e
+        finally:
+            # Lets a cut short generator clean up, e.g. a partial cache file
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        items.put(_Done(error))
+
+    def __iter__(self) -> Iterator[Any]:
+        items: queue.Queue = queue.Queue()
+        threading.Thread(
+            target=in_current_context(self.produce),
+            args=(items,),
+            daemon=True,
+        ).start()
+        try:
+            while True:
+                remaining = self.deadline - time.monotonic()
+                try:
+                    item = items.get(timeout=max(0.0, remaining))
+                except queue.Empty:
+                    self.expired = True
+                    return
+                if isinstance(item, _Done):
+                    if item.error is not None:
+                        raise item.error
+                    return
+                yield item
+        finally:
+            self._stopped.set()
@@ -0,0 +1,72 @@
+import dataclasses
+import queue
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+from utils.aws import Config
+from utils.trace import in_current_context
+
+
+class FanOutTimeout(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class TargetResult:
+    config: Config
+    options: List[dict] = dataclasses.field(default_factory=list)
+    error: Optional[BaseException] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.config.aws_profile}/{self.config.region}"
+
+
+def fan_out(
+    targets: List[Config],
+    fetch: Callable[[Config], List[dict]],
+    max_workers: int,
+    timeout: float,
+) -> Iterator[TargetResult]:
+    """
+    Runs fetch for every target on a bounded set of worker threads and
+    yields the results as they complete.
+
+    Targets still running when the timeout expires are reported as failed.
+    Workers are daemon threads, so a slow region never delays the exit.
+    """
+    pending: queue.Queue = queue.Queue()
+    for target in targets:
+        pending.put(target)
+    results: queue.Queue = queue.Queue()
+
+    def work():
+        while True:
+            try:
+                target = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results.put(TargetResult(target, options=fetch(target)))
+            except Exception as e:
+                results.put(TargetResult(target, error=e))
+
+    for _ in range(min(max_workers, len(targets))):
+        threading.Thread(target=in_current_context(work), daemon=True).start()
+
+    deadline = time.monotonic() + timeout
+    completed = set()
+    while len(completed) < len(targets):
+        try:
+            result = results.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            break
+        completed.add(id(result.config))
+        yield result
+    for target in targets:
+        if id(target) not in completed:
+            yield TargetResult(
+                target,
+                error=FanOutTimeout(f"no response after {timeout:g}s"),
+            )
@@ -0,0 +1,57 @@
+import contextlib
+import os
+import pathlib
+import time
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Seconds between two attempts to take a busy lock
+LOCK_POLL_INTERVAL = 0.05
+
+
+@contextlib.contextmanager
+def locked(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive advisory lock on `path` for the duration of the block.
+    Locking is skipped on platforms without fcntl.
+    """
+    pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def locked_within(path: str, timeout: float) -> Iterator[bool]:
+    """
+    Like `locked`, but gives up waiting after `timeout` seconds.
+    Yields whether the lock is held, the block runs either way.
+    """
+    pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as lock_file:
+        if fcntl is None:
+            yield True
+            return
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,88 @@
+import heapq
+from typing import Callable, Generator, Iterable, List, Optional, Tuple
+
+NO_MATCH = 0.0
+
+
+def closeness(distance: int) -> float:
+    """
+    1 for no distance, approaching 0 as it grows.
+    """
+    return 1 / (1 + distance)
+
+
+def score(query: str, key: str) -> float:
+    """
+    Scores how well a lowercase query matches a lowercase key.
+
+    Prefix matches rank above substring matches,
+    which rank above matching the query as a subsequence.
+    Matches further into the key rank lower, and of otherwise equal
+    matches the shorter key ranks higher, so an exact match comes first.
+    """
+    if not key:
+        return NO_MATCH
+    extra = len(key) - len(query)
+    if key.startswith(query):
+        return 3 + closeness(extra)
+    position = key.find(query)
+    if position >= 0:
+        at_word_start = not key[position - 1].isalnum()
+        return (
+            2
+            + (0.5 if at_word_start else 0)
+            + 0.4 * closeness(position)
+            + 0.1 * closeness(extra)
+        )
+    gaps = 0
+    position = 0
+    for char in query:
+        found = key.find(char, position)
+        if found < 0:
+            return NO_MATCH
+        gaps += found - position
+        position = found + 1
+    return 0.9 * closeness(gaps) + 0.1 * closeness(extra)
+
+
+def title(option: dict) -> str:
+    return option["title"]
+
+
+def rank(
+    options: Iterable[dict],
+    query: str,
+    limit: Optional[int],
+    key: Callable[[dict], str] = title,
+) -> Generator[dict, None, int]:
+    """
+    Yields the best `limit` options for the query
+    and returns how many options matched in total.
+    Options are matched by `key`, their title by default.
+
+    Without a query options keep their order and are streamed as they come,
+    all of them when there is no limit.
+    """
+    matches = 0
+    if not query:
+        for option in options:
+            matches += 1
+            if limit is None or matches <= limit:
+                yield option
+        return matches
+    query = query.lower()
+    best: List[Tuple[float, int, dict]] = []
+    for position, option in enumerate(options):
+        option_score = score(query, key(option).lower())
+        if option_score == NO_MATCH:
+            continue
+        matches += 1
+        # The position keeps equally scored options in listing order
+        scored = (option_score, -position, option)
+        if limit is None or len(best) < limit:
+            heapq.heappush(best, scored)
+        else:
+            heapq.heappushpop(best, scored)
+    for _, _, option in sorted(best, key=lambda s: s[:2], reverse=True):
+        yield option
+    return matches
@@ -0,0 +1,120 @@
+import json
+import os
+import pathlib
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.aws import get_config_path
+
+# The trigram tokenizer matches any substring of three characters or more
+FTS_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS resources USING fts5("
+    "title, scope UNINDEXED, service UNINDEXED, source UNINDEXED, "
+    "option UNINDEXED, tokenize='trigram')"
+)
+# Used when SQLite was built without FTS5 or the trigram tokenizer
+PLAIN_TABLE = (
+    "CREATE TABLE IF NOT EXISTS resources ("
+    "title TEXT, scope TEXT, service TEXT, source TEXT, option TEXT)"
+)
+MIN_TRIGRAM_QUERY = 3
+# Where indexed resources came from, each source only replaces its own
+LISTING_SOURCE = "listing"
+TAGGING_SOURCE = "tagging"
+
+
+class InventoryIndex:
+    """
+    Search index over the resources of every service listing,
+    stored in SQLite under the config directory.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(get_config_path(), "inventory.db")
+        pathlib.Path(os.path.dirname(self.path)).mkdir(
+            parents=True, exist_ok=True
+        )
+        self.connection = sqlite3.connect(self.path, timeout=5)
+        columns = [
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(resources)")
+        ]
+        if columns and "source" not in columns:
+            # Indexed before resources had a source, refilled by the lists
+            self.connection.execute("DROP TABLE resources")
+        try:
+            self.connection.execute(FTS_TABLE)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.connection.execute(PLAIN_TABLE)
+            self.full_text = False
+
+    def close(self):
+        self.connection.close()
+
+    def replace(
+        self,
+        scope: str,
+        service_id: str,
+        options: Iterable[dict],
+        source: str = LISTING_SOURCE,
+    ):
+        """
+        Swaps the indexed resources of one service from one source,
+        leaving the other services, scopes and sources untouched.
+
+        Resources are identified by their title. Listed resources replace
+        the tagged ones, the tagging API only adds resources no list has.
+        """
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM resources "
+                "WHERE scope = ? AND service = ? AND source = ?",
+                (scope, service_id, source),
+            )
+            # Rows of the other source by title
+            others: Dict[str, List[int]] = {}
+            for rowid, title in self.connection.execute(
+                "SELECT rowid, title FROM resources "
+                "WHERE scope = ? AND service = ? AND source != ?",
+                (scope, service_id, source),
+            ):
+                others.setdefault(title, []).append(rowid)
+            for option in options:
+                title = option["title"]
+                if title in others:
+                    if source != LISTING_SOURCE:
+                        continue
+                    self.connection.executemany(
+                        "DELETE FROM resources WHERE rowid = ?",
+                        ((rowid,) for rowid in others.pop(title)),
+                    )
+                self.connection.execute(
+                    "INSERT INTO resources "
+                    "(title, scope, service, source, option) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (title, scope, service_id, source, json.dumps(option)),
+                )
+
+    def search(
+        self, scope: str, query: str, limit: int = 50
+    ) -> List[Tuple[str, dict]]:
+        if self.full_text and len(query) >= MIN_TRIGRAM_QUERY:
+            rows = self.connection.execute(
+                "SELECT service, option FROM resources "
+                "WHERE resources MATCH ? AND scope = ? "
+                "ORDER BY rank LIMIT ?",
+                ('"' + query.replace('"', '""') + '"', scope, limit),
+            )
+        else:
+            escaped = (
+                query.replace("\\", "\\\\")
+                .replace("%", "\\%")
+                .replace("_", "\\_")
+            )
+            rows = self.connection.execute(
+                "SELECT service, option FROM resources "
+                "WHERE title LIKE ? ESCAPE '\\' AND scope = ? LIMIT ?",
+                (f"%{escaped}%", scope, limit),
+            )
+        return [(service, json.loads(option)) for service, option in rows]
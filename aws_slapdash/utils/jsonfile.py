@@ -0,0 +1,24 @@
+import json
+import os
+import pathlib
+import threading
+from typing import Any
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    try:
+        with open(path) as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path: str, value: Any) -> None:
+    """
+    Replaces the file at once, readers never see a partially written file.
+    """
+    pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as json_file:
+        json.dump(value, json_file)
+    os.replace(tmp_path, path)
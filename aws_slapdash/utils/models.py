@@ -0,0 +1,108 @@
+"""
+Cache of the botocore data files the commands load.
+
+botocore parses gzipped JSON models every time a client is created,
+the ec2 model alone takes more than 100 ms. Models are stored compacted
+under the config directory on first use, keyed by the botocore version.
+"""
+import marshal
+import os
+import sys
+import tempfile
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    import botocore.session
+
+MODEL_CACHE_DIR = "models"
+# Models of the services the commands call, others are loaded as usual
+CACHED_SERVICES = {
+    "cloudformation",
+    "dynamodb",
+    "ec2",
+    "ecs",
+    "resourcegroupstaggingapi",
+    "secretsmanager",
+    "ssm",
+}
+
+
+def compact(value: Any) -> Any:
+    """
+    Drops the documentation, which is only read to build docstrings,
+    and turns the OrderedDicts botocore loads into plain dicts,
+    which keep their order and load several times faster.
+    """
+    if isinstance(value, dict):
+        return {
+            key: compact(item)
+            for key, item in value.items()
+            if not (key == "documentation" and isinstance(item, str))
+        }
+    if isinstance(value, list):
+        return [compact(item) for item in value]
+    return value
+
+
+def read_cached(path: str, load: Callable[[], Any]) -> Any:
+    try:
+        with open(path, "rb") as cache_file:
+            return marshal.loads(cache_file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    value = compact(load())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as cache_file:
+            cache_file.write(marshal.dumps(value))
+        os.replace(tmp_path, path)
+    except (OSError, ValueError):
+        # The model is loaded from botocore again next time
+        pass
+    return value
+
+
+def install_model_cache(session: "botocore.session.Session", config_path: str):
+    """
+    Serves the models of the session's data loader from the cache.
+    """
+    import botocore
+
+    loader = session.get_component("data_loader")
+    if getattr(loader, "slapdash_model_cache", False):
+        return
+    # The marshal format changes between Python versions
+    cache_dir = os.path.join(
+        config_path,
+        MODEL_CACHE_DIR,
+        f"botocore-{botocore.__version__}-py{sys.version_info[0]}"
+        f".{sys.version_info[1]}",
+    )
+    load_service_model = loader.load_service_model
+    load_data_with_path = loader.load_data_with_path
+
+    def cached_load_service_model(service_name, type_name, api_version=None):
+        if service_name not in CACHED_SERVICES:
+            return load_service_model(service_name, type_name, api_version)
+        return read_cached(
+            os.path.join(
+                cache_dir,
+                f"{service_name}.{type_name}.{api_version or 'latest'}",
+            ),
+            lambda: load_service_model(service_name, type_name, api_version),
+        )
+
+    def cached_load_data_with_path(name):
+        # Data shared by all services, like endpoints and partitions
+        if "/" in name:
+            return load_data_with_path(name)
+        data, path = read_cached(
+            os.path.join(cache_dir, name),
+            lambda: list(load_data_with_path(name)),
+        )
+        return data, path
+
+    loader.load_service_model = cached_load_service_model
+    loader.load_data_with_path = cached_load_data_with_path
+    loader.slapdash_model_cache = True
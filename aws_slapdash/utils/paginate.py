@@ -0,0 +1,124 @@
+import dataclasses
+import queue
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+
+from utils.trace import current, in_current_context
+
+# Marks the end of the pages in the queue
+_DONE = object()
+
+
+@dataclasses.dataclass
+class PaginationStats:
+    pages: int = 0
+    items: int = 0
+    latencies: List[float] = dataclasses.field(default_factory=list)
+
+    @property
+    def total_latency(self) -> float:
+        return sum(self.latencies)
+
+
+class PageStream:
+    """
+    Iterates over the items of a paginated AWS operation.
+
+    Pages are fetched on a worker thread, so the next page is already
+    requested while the current one is being rendered.
+    """
+
+    def __init__(
+        self,
+        client,
+        operation_name: str,
+        result_key: str,
+        page_size: Optional[int] = None,
+        max_items: Optional[int] = None,
+        prefetch: int = 2,
+        **kwargs,
+    ):
+        self.client = client
+        self.operation_name = operation_name
+        self.result_key = result_key
+        self.pagination_config = {}
+        if page_size is not None:
+            self.pagination_config["PageSize"] = page_size
+        if max_items is not None:
+            self.pagination_config["MaxItems"] = max_items
+        self.prefetch = prefetch
+        self.kwargs = kwargs
+        self.stats = PaginationStats()
+        # Captured now, the worker thread may outlive the invocation
+        self.trace = current()
+
+    def _fetch_pages(self, pages: queue.Queue, stopped: threading.Event):
+        try:
+            paginator = self.client.get_paginator(self.operation_name)
+            page_iterator = iter(
+                paginator.paginate(
+                    PaginationConfig=self.pagination_config, **self.kwargs
+                )
+            )
+            while not stopped.is_set():
+                started_at = time.perf_counter()
+                page = next(page_iterator, _DONE)
+                if page is not _DONE:
+                    latency = time.perf_counter() - started_at
+                    self.stats.latencies.append(latency)
+                    if self.trace is not None:
+                        self.trace.record(
+                            "page",
+                            started_at,
+                            latency,
+                            operation=self.operation_name,
+                        )
+                self._put(pages, stopped, page)
+                if page is _DONE:
+                    return
+        except Exception as e:
+            self._put(pages, stopped, e)
+
+    @staticmethod
+    def _put(pages: queue.Queue, stopped: threading.Event, item: Any):
+        # Give up when the consumer went away instead of blocking forever
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def pages(self) -> Iterator[dict]:
+        pages: queue.Queue = queue.Queue(maxsize=self.prefetch)
+        stopped = threading.Event()
+        worker = threading.Thread(
+            target=in_current_context(self._fetch_pages),
+            args=(pages, stopped),
+            daemon=True,
+        )
+        worker.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is _DONE:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                self.stats.pages += 1
+                yield page
+        finally:
+            stopped.set()
+
+    def __iter__(self) -> Iterator[Any]:
+        for page in self.pages():
+            items = page.get(self.result_key, [])
+            self.stats.items += len(items)
+            yield from items
+
+
+def paginate(
+    client, operation_name: str, result_key: str, **kwargs
+) -> PageStream:
+    return PageStream(client, operation_name, result_key, **kwargs)
@@ -0,0 +1,145 @@
+"""
+Client side rate limiting of AWS calls.
+
+Every profile, region and service shares a token bucket sized to the
+request rate the service documents for the calls the commands make,
+so concurrent fan-out stays under the quota instead of being throttled.
+Throttled attempts are recorded in the trace.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from utils.aws import THROTTLING_ERROR_CODES, Config
+from utils.trace import current
+
+# Requests per second and burst of the read calls of each service
+SERVICE_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    # Non mutating actions share a bucket of 100 refilled at 20 per second
+    "ec2": (20, 100),
+    # Describe and list calls, 20 per second with bursts of 50
+    "ecs": (20, 50),
+    # Control plane calls like DescribeTable and ListTables
+    "dynamodb": (100, 100),
+    # DescribeStacks, ListStacks and friends are throttled early
+    "cloudformation": (10, 20),
+    # ListSecrets and BatchGetSecretValue, 100 per second each
+    "secretsmanager": (100, 100),
+    "ssm": (20, 40),
+    "resourcegroupstaggingapi": (10, 20),
+}
+# Throttled and transient errors are retried with adaptive backoff,
+# instead of the legacy mode's fixed exponential delays
+RETRIES = {"mode": "adaptive", "total_max_attempts": 3}
+# botocore's default, raised to the fan-out workers when there are more
+MIN_POOL_CONNECTIONS = 10
+
+_buckets: Dict[tuple, "TokenBucket"] = {}
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token, returning how long to wait before it is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+def bucket_for(config: Config, service_name: str) -> Optional[TokenBucket]:
+    limit = SERVICE_RATE_LIMITS.get(service_name)
+    if limit is None:
+        return None
+    key = (config.aws_profile, config.region, service_name)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(*limit)
+        return bucket
+
+
+def record_wait(service_name: str, started_at: float, wait: float):
+    trace = current()
+    if trace is not None:
+        trace.record("rate limit", started_at, wait, service=service_name)
+
+
+def count_throttles(client: Any, service_name: str):
+    """
+    Records throttled attempts, retried or not, as `throttle` spans.
+    """
+
+    def record_throttle(response=None, operation=None, **kwargs):
+        if response is None:
+            return
+        code = response[1].get("Error", {}).get("Code")
+        trace = current()
+        if code in THROTTLING_ERROR_CODES and trace is not None:
+            trace.record(
+                "throttle",
+                time.perf_counter(),
+                0.0,
+                service=service_name,
+                operation=operation.name,
+            )
+
+    client.meta.events.register("needs-retry", record_throttle)
+
+
+def install_rate_limiter(client: Any, config: Config, service_name: str):
+    """
+    Every attempt, retries included, waits for a token before it is sent.
+    """
+    bucket = bucket_for(config, service_name)
+    events = client.meta.events
+
+    def wait_for_token(**kwargs):
+        wait = bucket.reserve()
+        if wait > 0:
+            started_at = time.perf_counter()
+            time.sleep(wait)
+            record_wait(service_name, started_at, wait)
+
+    if bucket is not None:
+        events.register("before-send", wait_for_token)
+    count_throttles(client, service_name)
+
+
+def install_async_rate_limiter(client: Any, config: Config, service_name: str):
+    """
+    The same for aiobotocore clients, waiting without blocking the loop.
+    """
+    bucket = bucket_for(config, service_name)
+    events = client.meta.events
+
+    async def wait_for_token(**kwargs):
+        wait = bucket.reserve()
+        if wait > 0:
+            started_at = time.perf_counter()
+            await asyncio.sleep(wait)
+            record_wait(service_name, started_at, wait)
+
+    if bucket is not None:
+        events.register("before-send", wait_for_token)
+    count_throttles(client, service_name)
+
+
+def pool_connections(config: Config) -> int:
+    return max(MIN_POOL_CONNECTIONS, config.fanout_workers)
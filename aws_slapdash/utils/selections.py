@@ -0,0 +1,97 @@
+"""
+How often each resource is opened from a list view.
+
+Scores decay over time, so resources that stopped being used make room
+for new ones. Only the drill-down param values are stored.
+Resources whose prefetch failed, e.g. because they were deleted, are left
+out until they are opened again or the backoff passed.
+"""
+import os
+import time
+from typing import Dict, List
+
+from utils.aws import Config, get_config_path
+from utils.filelock import locked
+from utils.jsonfile import read_json, write_json
+
+SELECTIONS_FILE = "selections.json"
+# When each service last started prefetching
+PREFETCH_FILE = "prefetch.json"
+# A selection counts half as much after a week
+SCORE_HALF_LIFE = 7 * 24 * 60 * 60
+# Resources kept per service, the least used are dropped
+MAX_SELECTIONS = 100
+# Least seconds between two prefetch runs of a service
+PREFETCH_INTERVAL = 60
+# Seconds a resource whose prefetch failed is not prefetched again
+FAILED_PREFETCH_BACKOFF = 24 * 60 * 60
+
+
+def decayed(score: float, since: float, now: float) -> float:
+    return score * 0.5 ** ((now - since) / SCORE_HALF_LIFE)
+
+
+class SelectionLog:
+    def __init__(self, config: Config, service_id: str):
+        self.key = f"{config.scope_key()}|{service_id}"
+        self.path = os.path.join(get_config_path(), SELECTIONS_FILE)
+
+    def record(self, value: str):
+        now = time.time()
+        with locked(self.path + ".lock"):
+            selections = read_json(self.path, {})
+            scores = selections.setdefault(self.key, {})
+            previous = scores.get(value)
+            score = 1.0
+            if previous is not None:
+                score += decayed(previous["score"], previous["at"], now)
+            scores[value] = {"score": score, "at": now}
+            if len(scores) > MAX_SELECTIONS:
+                for dropped in self.ranked(scores, now)[MAX_SELECTIONS:]:
+                    del scores[dropped]
+            write_json(self.path, selections)
+
+    def record_failure(self, value: str):
+        with locked(self.path + ".lock"):
+            selections = read_json(self.path, {})
+            selection = selections.get(self.key, {}).get(value)
+            if selection is None:
+                return
+            # Cleared by the next record, when the user opens it again
+            selection["failedAt"] = time.time()
+            write_json(self.path, selections)
+
+    def top(self, count: int) -> List[str]:
+        """
+        The most opened resources, skipping those whose prefetch failed.
+        """
+        now = time.time()
+        scores = read_json(self.path, {}).get(self.key, {})
+        return [
+            value
+            for value in self.ranked(scores, now)
+            if now - scores[value].get("failedAt", 0) > FAILED_PREFETCH_BACKOFF
+        ][:count]
+
+    def claim_prefetch(self) -> bool:
+        """
+        Whether the service may start prefetching,
+        at most once every PREFETCH_INTERVAL seconds.
+        """
+        path = os.path.join(get_config_path(), PREFETCH_FILE)
+        with locked(path + ".lock"):
+            started = read_json(path, {})
+            if time.time() - started.get(self.key, 0) < PREFETCH_INTERVAL:
+                return False
+            started[self.key] = time.time()
+            write_json(path, started)
+        return True
+
+    @staticmethod
+    def ranked(scores: Dict[str, dict], now: float) -> List[str]:
+        return sorted(
+            scores,
+            key=lambda value: -decayed(
+                scores[value]["score"], scores[value]["at"], now
+            ),
+        )
@@ -0,0 +1,19 @@
+import importlib
+from typing import TYPE_CHECKING, Dict, Type
+
+if TYPE_CHECKING:
+    from utils.command import AWSServiceCommand
+
+# Modules are imported on demand, so a command only loads what it serves
+SERVICE_COMMANDS: Dict[str, str] = {
+    "cloudformation": "aws_slapdash.cloudformation:CloudformationCommand",
+    "dynamodb": "aws_slapdash.dynamodb:DynamoDBCommand",
+    "ec2": "aws_slapdash.ec2:Ec2Command",
+    "ecs": "aws_slapdash.ecs:EcsCommand",
+    "secretsmanager": "aws_slapdash.secretsmanager:SecretsManagerCommand",
+}
+
+
+def load_service_command(command_name: str) -> Type["AWSServiceCommand"]:
+    module_name, class_name = SERVICE_COMMANDS[command_name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
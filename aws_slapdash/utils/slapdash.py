@@ -1,4 +1,13 @@
+import itertools
 import json
+import sys
+import time
+from typing import Iterable, Iterator, Optional, TextIO
+
+from utils.trace import current
+
+# Options written between two flushes of the output
+FLUSH_EVERY = 100
 
 
 class Actions:
@@ -8,9 +17,82 @@ class Actions:
     OPEN_URL = "open-url"
 
 
+class SlapdashMessage(Exception):
+    """
+    Ends the command with a message view. Raised instead of printing it,
+    so the message is written to the output of the request that raised it.
+    """
+
+
 def slapdash_show_message_and_exit(msg: str) -> None:
     """
     Useful for showing error messages
     """
-    print(json.dumps({"view": msg}))
-    exit()
+    raise SlapdashMessage(msg)
+
+
+def started(options: Iterable[dict]) -> Iterator[dict]:
+    """
+    Produces the first option right away, so the listing creates its
+    session and client, and fails to, before anything is written.
+    """
+    options = iter(options)
+    return itertools.chain(list(itertools.islice(options, 1)), options)
+
+
+def write_message(msg: str, out: Optional[TextIO] = None) -> None:
+    out = out or sys.stdout
+    out.write(json.dumps({"view": msg}) + "\n")
+    out.flush()
+
+
+def write_action(action: dict, out: Optional[TextIO] = None) -> None:
+    """
+    Runs an action right away instead of showing a view.
+    """
+    out = out or sys.stdout
+    out.write(json.dumps({"action": action}) + "\n")
+    out.flush()
+
+
+def write_list_view(
+    options: Iterable[dict], out: Optional[TextIO] = None
+) -> None:
+    """
+    Writes a list view one option at a time,
+    so options are sent to Slapdash as soon as they are available.
+
+    A message raised before the first option is left to the caller to
+    show as a message view. Once options went out, it ends the list as
+    its last option, so the view stays valid JSON.
+    """
+    out = out or sys.stdout
+    trace = current()
+    options = started(options)
+    # Only serializing and writing is timed, not producing the options
+    render_time = 0.0
+    started_at = time.perf_counter()
+    count = -1
+    out.write('{"view": {"type": "list", "options": [')
+    try:
+        for count, option in enumerate(options):
+            rendered_at = time.perf_counter()
+            if count:
+                out.write(", ")
+            out.write(json.dumps(option))
+            if count % FLUSH_EVERY == 0:
+                out.flush()
+            render_time += time.perf_counter() - rendered_at
+    except SlapdashMessage as message:
+        count += 1
+        if count:
+            out.write(", ")
+        out.write(json.dumps(message_option(str(message))))
+    out.write("]}}\n")
+    out.flush()
+    if trace is not None:
+        trace.record("render", started_at, render_time, options=count + 1)
+
+
+def message_option(msg: str) -> dict:
+    return {"title": msg, "action": {"type": Actions.COPY, "value": msg}}
@@ -0,0 +1,71 @@
+import re
+import subprocess
+import sys
+import time
+from typing import List, NamedTuple
+
+PROFILE_STARTUP_FLAG = "--profile-startup"
+IMPORT_TIME_LINE = re.compile(
+    r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$", re.MULTILINE
+)
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_import_times(stderr: str) -> List[ImportTiming]:
+    return [
+        ImportTiming(
+            module=match.group(4),
+            self_us=int(match.group(1)),
+            cumulative_us=int(match.group(2)),
+            depth=len(match.group(3)) // 2,
+        )
+        for match in IMPORT_TIME_LINE.finditer(stderr)
+    ]
+
+
+def profile_startup(argv: List[str], limit: int = 30) -> List[dict]:
+    """
+    Runs the command again with `-X importtime`
+    and lists the slowest imports.
+    """
+    command = [
+        sys.executable,
+        "-X",
+        "importtime",
+        *[arg for arg in argv if arg != PROFILE_STARTUP_FLAG],
+    ]
+    started_at = time.perf_counter()
+    completed = subprocess.run(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    wall_ms = (time.perf_counter() - started_at) * 1000
+    timings = parse_import_times(completed.stderr)
+    import_ms = sum(t.cumulative_us for t in timings if t.depth == 0) / 1000
+    options = [
+        {
+            "title": f"Total {wall_ms:.1f} ms | imports {import_ms:.1f} ms",
+            "action": {"type": "copy", "value": f"{wall_ms:.1f}"},
+        }
+    ]
+    slowest = sorted(timings, key=lambda t: t.cumulative_us, reverse=True)
+    for timing in slowest[:limit]:
+        options.append(
+            {
+                "title": (
+                    f"{timing.cumulative_us / 1000:.1f} ms | "
+                    f"self {timing.self_us / 1000:.1f} ms | {timing.module}"
+                ),
+                "action": {"type": "copy", "value": timing.module},
+            }
+        )
+    return options
@@ -0,0 +1,193 @@
+"""
+Refreshes the cached listings before they expire.
+
+Every listing already opened once is refreshed on the interval of its
+cache TTL, shortened by a random jitter so the services drift apart
+instead of refreshing in bursts. Throttled services back off
+exponentially. Run by the daemon when backgroundSync is set,
+or from cron with `aws-slapdash sync`.
+"""
+import dataclasses
+import os
+import random
+import time
+import traceback
+from typing import List, Optional
+
+from utils.aws import (
+    TAGGING_BACKEND,
+    Config,
+    get_config_path,
+    is_throttling_error,
+    load_config,
+)
+from utils.cache import ViewCache
+from utils.fanout import TargetResult
+from utils.filelock import locked
+from utils.jsonfile import read_json, write_json
+from utils.services import SERVICE_COMMANDS, load_service_command
+
+SYNC_STATE_FILE = "sync.json"
+# Refreshes run up to this fraction of the interval early
+SYNC_JITTER = 0.2
+# Longest a throttled service waits before its next refresh
+MAX_BACKOFF = 60 * 60
+# Seconds between two checks for due listings in the daemon
+SYNC_POLL_INTERVAL = 15
+
+
+@dataclasses.dataclass
+class SyncResult:
+    job: str
+    duration: float
+    next_at: float
+    error: Optional[str] = None
+    throttled: bool = False
+
+
+def jittered(seconds: float) -> float:
+    return seconds * (1 - SYNC_JITTER * random.random())
+
+
+def sync_jobs(config: Config) -> List[str]:
+    """
+    Services whose inventory view is cached, and the tagging API sweep
+    when it feeds the search index.
+    """
+    jobs = [
+        service_id
+        for service_id in SERVICE_COMMANDS
+        if ViewCache(config, service_id).load(
+            load_service_command(service_id).inventory_view
+        )
+        is not None
+    ]
+    if config.inventory_backend == TAGGING_BACKEND:
+        jobs.append(TAGGING_BACKEND)
+    return jobs
+
+
+def run_job(config: Config, job: str) -> List[TargetResult]:
+    if job == TAGGING_BACKEND:
+        from utils.tagging import sync_inventory
+
+        return sync_inventory(config)
+    return load_service_command(job)(config).refresh_inventory()
+
+
+class SyncState:
+    """
+    Last success, failures and next refresh of every job,
+    shared by the daemon and cron runs.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.path = os.path.join(get_config_path(), SYNC_STATE_FILE)
+
+    def key(self, job: str) -> str:
+        return f"{self.config.scope_key()}|{job}"
+
+    def claim(self, job: str, interval: float) -> Optional[dict]:
+        """
+        Returns the state of the job if it is due, pushing its next
+        refresh back so a concurrent sync skips it meanwhile.
+        """
+        with locked(self.path + ".lock"):
+            state = read_json(self.path, {})
+            job_state = state.get(self.key(job), {})
+            if job_state.get("nextAt", 0) > time.time():
+                return None
+            state[self.key(job)] = {
+                **job_state,
+                "nextAt": time.time() + interval,
+            }
+            write_json(self.path, state)
+        return job_state
+
+    def update(self, job: str, job_state: dict):
+        with locked(self.path + ".lock"):
+            state = read_json(self.path, {})
+            state[self.key(job)] = job_state
+            write_json(self.path, state)
+
+
+def sync_job(
+    config: Config, sync_state: SyncState, job: str
+) -> Optional[SyncResult]:
+    interval = config.ttl_for(job)
+    job_state = sync_state.claim(job, interval)
+    if job_state is None:
+        return None
+    started_at = time.time()
+    try:
+        failed = run_job(config, job)
+    except Exception as e:
+        failed = [TargetResult(config, error=e)]
+    finished_at = time.time()
+    if not failed:
+        next_at = finished_at + jittered(interval)
+        sync_state.update(
+            job, {"lastSuccess": finished_at, "failures": 0, "nextAt": next_at}
+        )
+        return SyncResult(job, finished_at - started_at, next_at)
+    failures = job_state.get("failures", 0) + 1
+    throttled = any(is_throttling_error(result.error) for result in failed)
+    delay = interval
+    if throttled:
+        delay = min(MAX_BACKOFF, interval * 2**failures)
+    next_at = finished_at + jittered(delay)
+    error = "; ".join(f"{result.label}: {result.error}" for result in failed)
+    sync_state.update(
+        job,
+        {
+            "lastSuccess": job_state.get("lastSuccess"),
+            "failures": failures,
+            "nextAt": next_at,
+            "error": error,
+        },
+    )
+    return SyncResult(job, finished_at - started_at, next_at, error, throttled)
+
+
+def sync_due(config: Config) -> List[SyncResult]:
+    """
+    Refreshes the due jobs one after the other.
+    """
+    sync_state = SyncState(config)
+    results = []
+    for job in sync_jobs(config):
+        result = sync_job(config, sync_state, job)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def format_result(result: SyncResult) -> str:
+    next_in = max(0, int(result.next_at - time.time()))
+    if result.error is None:
+        status = f"refreshed in {result.duration:.1f} s"
+    elif result.throttled:
+        status = f"throttled: {result.error}"
+    else:
+        status = f"failed: {result.error}"
+    return f"{result.job}: {status}, next in {next_in} s"
+
+
+def sync_forever():
+    """
+    Runs in a daemon thread, the config is reloaded on every check
+    so backgroundSync can be toggled without a restart.
+    """
+    while True:
+        try:
+            config = load_config()
+            if config.background_sync:
+                sync_due(config)
+        except FileNotFoundError:
+            # Not configured yet
+            pass
+        except Exception:
+            # Retried on the next check, never takes the daemon down
+            traceback.print_exc()
+        time.sleep(SYNC_POLL_INTERVAL)
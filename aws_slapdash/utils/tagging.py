@@ -0,0 +1,134 @@
+"""
+Account inventory from the Resource Groups Tagging API.
+
+One paged get_resources call lists the ARNs and tags of the resources of
+every service, each command turns them into the options of its inventory
+view. The API only returns resources that are or have been tagged.
+"""
+import os
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from utils.aws import Config, create_client, get_config_path
+from utils.fanout import TargetResult, fan_out
+from utils.inventory import TAGGING_SOURCE, InventoryIndex
+from utils.jsonfile import read_json, write_json
+from utils.paginate import paginate
+from utils.services import SERVICE_COMMANDS, load_service_command
+
+SYNC_STATE_FILE = "tagging.json"
+# Largest page get_resources returns
+GET_RESOURCES_PAGE_SIZE = 100
+# Resource type filters of the inventory views, stacks are not filtered
+# since their status is only known from list_stacks
+RESOURCE_TYPES = {
+    "dynamodb:table": "dynamodb",
+    "ec2:instance": "ec2",
+    "ecs:cluster": "ecs",
+    "secretsmanager:secret": "secretsmanager",
+}
+
+
+class TaggedResource(NamedTuple):
+    arn: str
+    tags: Dict[str, str]
+
+    @property
+    def resource_id(self) -> str:
+        """
+        The last part of the ARN, e.g. `instance/i-0123`.
+        """
+        return self.arn.split(":", 5)[5]
+
+    @property
+    def resource_type(self) -> str:
+        service = self.arn.split(":", 5)[2]
+        return f"{service}:{re.split('[/:]', self.resource_id)[0]}"
+
+
+def tagged_resources(config: Config) -> Dict[str, List[TaggedResource]]:
+    """
+    Tagged resources of one profile and region, by service.
+    """
+    client = create_client("resourcegroupstaggingapi", config)
+    resources: Dict[str, List[TaggedResource]] = {}
+    for mapping in paginate(
+        client,
+        "get_resources",
+        "ResourceTagMappingList",
+        page_size=GET_RESOURCES_PAGE_SIZE,
+        ResourceTypeFilters=list(RESOURCE_TYPES),
+    ):
+        resource = TaggedResource(
+            mapping["ResourceARN"],
+            {tag["Key"]: tag["Value"] for tag in mapping.get("Tags", [])},
+        )
+        service_id = RESOURCE_TYPES.get(resource.resource_type)
+        if service_id is not None:
+            resources.setdefault(service_id, []).append(resource)
+    return resources
+
+
+def target_inventory(config: Config) -> List[dict]:
+    resources = tagged_resources(config)
+    inventory = []
+    for service_id in SERVICE_COMMANDS:
+        command = load_service_command(service_id)(config)
+        for option in command.tagged_options(resources.get(service_id, [])):
+            inventory.append({"service": service_id, "option": option})
+    return inventory
+
+
+def sync_inventory(config: Config) -> List[TargetResult]:
+    """
+    Replaces the tagged resources in the search index of every service
+    with one sweep per profile and region. Resources the lists added are
+    kept. Failed targets are returned, and the previous index is kept as
+    is when there are any.
+    """
+    targets = config.targets()
+    results = list(
+        fan_out(
+            targets,
+            target_inventory,
+            config.fanout_workers,
+            config.fanout_timeout,
+        )
+    )
+    failed = [result for result in results if result.error is not None]
+    if failed:
+        return failed
+    options: Dict[str, List[dict]] = {
+        service_id: [] for service_id in SERVICE_COMMANDS
+    }
+    for result in results:
+        for entry in result.options:
+            option = entry["option"]
+            if len(targets) > 1:
+                option = {
+                    **option,
+                    "title": f"{result.label} | {option['title']}",
+                }
+            options[entry["service"]].append(option)
+    index = InventoryIndex()
+    try:
+        for service_id, service_options in options.items():
+            index.replace(
+                config.scope_key(),
+                service_id,
+                service_options,
+                TAGGING_SOURCE,
+            )
+    finally:
+        index.close()
+    path = os.path.join(get_config_path(), SYNC_STATE_FILE)
+    synced = read_json(path, {})
+    synced[config.scope_key()] = time.time()
+    write_json(path, synced)
+    return []
+
+
+def last_synced(config: Config) -> Optional[float]:
+    path = os.path.join(get_config_path(), SYNC_STATE_FILE)
+    return read_json(path, {}).get(config.scope_key())
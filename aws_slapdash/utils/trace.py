@@ -0,0 +1,320 @@
+"""
+Timing of the hot paths of an invocation.
+
+Every invocation appends its spans to a JSONL log under the config
+directory, `--trace` also prints them to stderr.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    TypeVar,
+)
+
+from utils.filelock import locked
+
+TRACE_FLAG = "--trace"
+TRACE_LOG = "trace.jsonl"
+# The log is rotated to trace.jsonl.1 once it grows past this size
+MAX_LOG_BYTES = 1024 * 1024
+# Params that pick a view, others like --query only filter it
+VIEW_PARAMS_IGNORED = {
+    "query",
+    "limit",
+    "refresh",
+    "refresh-cache",
+    "trace",
+}
+
+R = TypeVar("R")
+
+# Every request the daemon serves concurrently has its own trace
+_current: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar(
+    "trace", default=None
+)
+# Only the first invocation of a process pays for interpreter startup
+_startup_pending = True
+
+
+def process_age() -> Optional[float]:
+    """
+    Seconds since the process started, on Linux only.
+    """
+    try:
+        with open("/proc/self/stat") as stat_file:
+            # The command name may contain spaces, fields follow the last ")"
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    started_at = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    return max(0.0, uptime - started_at)
+
+
+def view_name(argv: List[str]) -> str:
+    """
+    Names the view an invocation served, e.g. `ec2?instance-id`.
+    """
+    params = {}
+    name = None
+    for arg, value in zip(argv, argv[1:] + [""]):
+        if not arg.startswith("--"):
+            continue
+        param = arg[2:]
+        if param in VIEW_PARAMS_IGNORED:
+            continue
+        if param in ("service-name", "service"):
+            name = value
+        else:
+            params[param] = value
+    name = name or "menu"
+    if not params:
+        return name
+    return name + "?" + "&".join(sorted(params))
+
+
+class Trace:
+    def __init__(self, view: str):
+        self.view = view
+        self.started_at = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(
+        self, name: str, started_at: float, duration: float, **attributes
+    ):
+        with self._lock:
+            self.spans.append(
+                {
+                    "name": name,
+                    "start": started_at - self.started_at,
+                    "duration": duration,
+                    **attributes,
+                }
+            )
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(
+                name,
+                started_at,
+                time.perf_counter() - started_at,
+                **attributes,
+            )
+
+    def entry(self) -> dict:
+        return {
+            "at": time.time(),
+            "view": self.view,
+            "duration": time.perf_counter() - self.started_at,
+            "spans": self.spans,
+        }
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def activated(trace: Optional[Trace]) -> Iterator[None]:
+    """
+    Makes `trace` the current one for the block, e.g. in a coroutine.
+    """
+    token = _current.set(trace)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def in_current_context(call: Callable[..., R]) -> Callable[..., R]:
+    """
+    Wraps `call` to run in the context of the caller, trace included,
+    on whatever thread runs it. Every run gets a copy, so the wrapper can
+    run on several threads at once.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(call, *args, **kwargs)
+
+
+def skip_startup_span():
+    """
+    The daemon serves many requests, none of them waits for its startup.
+    """
+    global _startup_pending
+    _startup_pending = False
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    """
+    Times the block as part of the current invocation, if any.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **attributes):
+        yield
+
+
+def write_log(config_path: str, entry: dict):
+    path = os.path.join(config_path, TRACE_LOG)
+    with locked(path + ".lock"):
+        try:
+            if os.path.getsize(path) > MAX_LOG_BYTES:
+                os.replace(path, path + ".1")
+        except OSError:
+            pass
+        with open(path, "a") as log_file:
+            log_file.write(json.dumps(entry) + "\n")
+
+
+def format_entry(entry: dict) -> str:
+    lines = [f"{entry['view']}: {entry['duration'] * 1000:.1f} ms"]
+    for recorded in sorted(entry["spans"], key=lambda s: s["start"]):
+        attributes = " ".join(
+            f"{key}={value}"
+            for key, value in recorded.items()
+            if key not in ("name", "start", "duration")
+        )
+        lines.append(
+            f"  {recorded['start'] * 1000:>8.1f} ms "
+            f"{recorded['duration'] * 1000:>8.1f} ms  "
+            f"{recorded['name']} {attributes}".rstrip()
+        )
+    return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def invocation(config_path: str, argv: List[str]) -> Iterator[Trace]:
+    """
+    Traces one invocation of the command, logging it when done.
+    """
+    global _startup_pending
+    trace = Trace(view_name(argv))
+    if _startup_pending:
+        _startup_pending = False
+        age = process_age()
+        if age is not None:
+            trace.record("startup", trace.started_at - age, age)
+    try:
+        with activated(trace):
+            yield trace
+    finally:
+        entry = trace.entry()
+        try:
+            write_log(config_path, entry)
+        except OSError:
+            # Tracing never fails the command
+            pass
+        if TRACE_FLAG in argv:
+            print(format_entry(entry), file=sys.stderr)
+
+
+class ViewSummary(NamedTuple):
+    view: str
+    runs: int
+    p50: float
+    p95: float
+    spans: Dict[str, "SpanSummary"]
+
+
+class SpanSummary(NamedTuple):
+    name: str
+    count: int
+    p50: float
+    p95: float
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = max(0, int(round(fraction * len(ordered))) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def load_entries(config_path: str, limit: int) -> List[dict]:
+    """
+    The most recent logged invocations, rotated log included.
+    """
+    path = os.path.join(config_path, TRACE_LOG)
+    entries = []
+    for log_path in [path + ".1", path]:
+        try:
+            with open(log_path) as log_file:
+                for line in log_file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # Left by a write that was cut short
+                        continue
+        except OSError:
+            continue
+    return entries[-limit:]
+
+
+def summarize(entries: List[dict]) -> List[ViewSummary]:
+    by_view: Dict[str, List[dict]] = {}
+    for entry in entries:
+        by_view.setdefault(entry["view"], []).append(entry)
+    summaries = []
+    for view, view_entries in by_view.items():
+        durations: Dict[str, List[float]] = {}
+        for entry in view_entries:
+            for recorded in entry["spans"]:
+                durations.setdefault(recorded["name"], []).append(
+                    recorded["duration"]
+                )
+        totals = [entry["duration"] for entry in view_entries]
+        summaries.append(
+            ViewSummary(
+                view=view,
+                runs=len(view_entries),
+                p50=percentile(totals, 0.5),
+                p95=percentile(totals, 0.95),
+                spans={
+                    name: SpanSummary(
+                        name=name,
+                        count=len(values),
+                        p50=percentile(values, 0.5),
+                        p95=percentile(values, 0.95),
+                    )
+                    for name, values in durations.items()
+                },
+            )
+        )
+    return sorted(summaries, key=lambda summary: -summary.p95)
+
+
+def format_summary(summaries: List[ViewSummary]) -> str:
+    lines = [f"{'view':<40} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9}"]
+    for summary in summaries:
+        lines.append(
+            f"{summary.view:<40} {summary.runs:>5} "
+            f"{summary.p50 * 1000:>9.1f} {summary.p95 * 1000:>9.1f}"
+        )
+        for span_summary in sorted(
+            summary.spans.values(), key=lambda s: -s.p95
+        ):
+            lines.append(
+                f"  {span_summary.name:<38} {span_summary.count:>5} "
+                f"{span_summary.p50 * 1000:>9.1f} "
+                f"{span_summary.p95 * 1000:>9.1f}"
+            )
+    return "\n".join(lines)
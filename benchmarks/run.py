@@ -0,0 +1,344 @@
+"""
+Benchmarks every service command against a local moto server.
+
+    poetry run python benchmarks/run.py --sizes 100,1000
+
+Each view runs in a fresh process, as Slapdash runs it. Results are
+appended to a JSONL file, and compared to a baseline when one is given.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AWS_SCRIPT = os.path.join(REPO_ROOT, "aws_slapdash", "aws.py")
+SEED_SCRIPT = os.path.join(REPO_ROOT, "benchmarks", "seed.py")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+SERVER_START_TIMEOUT = 30
+REGION = "eu-west-1"
+# Slower or bigger than the baseline by more than this is a regression
+DEFAULT_THRESHOLD = 0.2
+
+# Name of the view and the params Slapdash passes to open it
+VIEWS: List[Tuple[str, List[str]]] = [
+    ("menu", []),
+    ("cloudformation", ["--service-name", "cloudformation"]),
+    ("dynamodb", ["--service-name", "dynamodb"]),
+    (
+        "dynamodb-enriched",
+        ["--service-name", "dynamodb", "--enriched", "true"],
+    ),
+    ("ec2", ["--service-name", "ec2"]),
+    ("ecs", ["--service-name", "ecs"]),
+    ("ecs-tasks", ["--service-name", "ecs", "--cluster-name", "cluster-0"]),
+    ("secretsmanager", ["--service-name", "secretsmanager"]),
+]
+# Views that are not cached only run fresh
+UNCACHED_VIEWS = {"menu", "ecs-tasks"}
+
+
+@dataclasses.dataclass
+class Run:
+    latency: float
+    peak_rss_kb: int
+    output_bytes: int
+    options: int
+
+
+@dataclasses.dataclass
+class Result:
+    size: int
+    view: str
+    phase: str
+    latency: float
+    latencies: List[float]
+    peak_rss_kb: int
+    output_bytes: int
+    options: int
+    revision: str
+    timestamp: float
+
+    @property
+    def key(self) -> Tuple[int, str, str]:
+        return self.size, self.view, self.phase
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start_server(port: int) -> subprocess.Popen:
+    """
+    Moto runs in its own process: Linux carries the peak RSS of a parent
+    over to the commands it spawns, so this process has to stay small.
+    """
+    server = subprocess.Popen(
+        [sys.executable, "-m", "moto.server", "-H", "127.0.0.1"]
+        + ["-p", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("moto server did not start")
+
+
+def command_env(endpoint_url: str, config_home: str = "") -> Dict[str, str]:
+    env = dict(os.environ)
+    # get_config_path prefers APPDATA over XDG_CONFIG_HOME
+    env.pop("APPDATA", None)
+    env.pop("AWS_PROFILE", None)
+    env.update(
+        {
+            "XDG_CONFIG_HOME": config_home,
+            "AWS_ENDPOINT_URL": endpoint_url,
+            "AWS_ACCESS_KEY_ID": "benchmark",
+            "AWS_SECRET_ACCESS_KEY": "benchmark",
+            # Benchmarks the working tree rather than an installed version
+            "PYTHONPATH": os.pathsep.join(
+                [REPO_ROOT, *filter(None, [env.get("PYTHONPATH")])]
+            ),
+        }
+    )
+    return env
+
+
+def write_config(config_home: str):
+    config_path = os.path.join(config_home, "aws_slapdash")
+    os.makedirs(config_path, exist_ok=True)
+    with open(os.path.join(config_path, "config.json"), "w") as config_file:
+        # An empty profile makes boto3 use the credentials from the env.
+        # Listings are timed complete, without background prefetches
+        json.dump(
+            {
+                "profile": "",
+                "region": REGION,
+                "awsVault": False,
+                "renderDeadline": 0,
+                "prefetchCount": 0,
+            },
+            config_file,
+        )
+
+
+def run_view(params: List[str], env: Dict[str, str]) -> Run:
+    """
+    Runs the command once, measuring it from spawn to exit.
+    """
+    with tempfile.TemporaryFile() as output:
+        started_at = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, AWS_SCRIPT, *params],
+            stdout=output,
+            stderr=subprocess.DEVNULL,
+            env=env,
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        latency = time.perf_counter() - started_at
+        # Keeps Popen from waiting on the already reaped process
+        process.returncode = (
+            os.WEXITSTATUS(status)
+            if os.WIFEXITED(status)
+            else -os.WTERMSIG(status)
+        )
+        if process.returncode:
+            raise RuntimeError(f"{params} exited with {process.returncode}")
+        output.seek(0)
+        body = output.read()
+    view = json.loads(body)["view"]
+    return Run(
+        latency=latency,
+        # ru_maxrss is in kilobytes on Linux
+        peak_rss_kb=usage.ru_maxrss,
+        output_bytes=len(body),
+        options=len(view["options"]) if isinstance(view, dict) else 0,
+    )
+
+
+def measure(
+    size: int,
+    view: str,
+    phase: str,
+    params: List[str],
+    env: Dict[str, str],
+    repeat: int,
+    revision: str,
+) -> Result:
+    runs = [run_view(params, env) for _ in range(repeat)]
+    return Result(
+        size=size,
+        view=view,
+        phase=phase,
+        latency=statistics.median(run.latency for run in runs),
+        latencies=[run.latency for run in runs],
+        peak_rss_kb=max(run.peak_rss_kb for run in runs),
+        output_bytes=runs[-1].output_bytes,
+        options=runs[-1].options,
+        revision=revision,
+        timestamp=time.time(),
+    )
+
+
+def benchmark_size(
+    size: int, views: List[str], repeat: int, revision: str
+) -> List[Result]:
+    """
+    Seeds a fresh moto server, then runs every view fresh and cached.
+    """
+    port = free_port()
+    server = start_server(port)
+    endpoint_url = f"http://127.0.0.1:{port}"
+    results = []
+    try:
+        subprocess.run(
+            [sys.executable, SEED_SCRIPT, "--size", str(size)]
+            + ["--region", REGION],
+            env=command_env(endpoint_url),
+            check=True,
+        )
+        with tempfile.TemporaryDirectory() as config_home:
+            write_config(config_home)
+            env = command_env(endpoint_url, config_home)
+            for view, params in VIEWS:
+                if view not in views:
+                    continue
+                results.append(
+                    measure(
+                        size,
+                        view,
+                        "fresh",
+                        [*params, "--refresh", "true"],
+                        env,
+                        repeat,
+                        revision,
+                    )
+                )
+                if view in UNCACHED_VIEWS:
+                    continue
+                results.append(
+                    measure(
+                        size, view, "cached", params, env, repeat, revision
+                    )
+                )
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def load_results(path: str) -> Dict[Tuple[int, str, str], dict]:
+    with open(path) as results_file:
+        results = [json.loads(line) for line in results_file if line.strip()]
+    # The latest run of a view wins when the file holds several runs
+    return {
+        (result["size"], result["view"], result["phase"]): result
+        for result in results
+    }
+
+
+def regressions(
+    results: List[Result], baseline_path: str, threshold: float
+) -> List[str]:
+    baseline = load_results(baseline_path)
+    found = []
+    for result in results:
+        before = baseline.get(result.key)
+        if before is None:
+            continue
+        for metric in ["latency", "peak_rss_kb", "output_bytes"]:
+            was, now = before[metric], getattr(result, metric)
+            if was and now > was * (1 + threshold):
+                found.append(
+                    f"{result.view} {result.phase} ({result.size}): "
+                    f"{metric} {was:g} -> {now:g}"
+                )
+    return found
+
+
+def print_result(result: Result):
+    print(
+        f"{result.size:>6} {result.view:<18} {result.phase:<6} "
+        f"{result.latency * 1000:>9.1f} ms "
+        f"{result.peak_rss_kb / 1024:>7.1f} MB "
+        f"{result.output_bytes:>10} B {result.options:>6} options"
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        default="100,1000",
+        help="Comma separated numbers of resources to seed of every kind",
+    )
+    parser.add_argument(
+        "--views",
+        default=",".join(view for view, _ in VIEWS),
+        help="Comma separated views to run",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--output",
+        default=os.path.join(
+            RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".jsonl"
+        ),
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Results file to compare with, exits with 1 on regressions",
+    )
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    revision = git_revision()
+    views = args.views.split(",")
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for result in benchmark_size(size, views, args.repeat, revision):
+            print_result(result)
+            results.append(result)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "a") as results_file:
+        for result in results:
+            results_file.write(json.dumps(dataclasses.asdict(result)) + "\n")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        found = regressions(results, args.baseline, args.threshold)
+        for regression in found:
+            print(f"Regression: {regression}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import dataclasses
+import json
+from typing import Callable, Iterable
+
+import boto3
+
+# run_instances starts at most this many instances per call in moto
+INSTANCES_PER_CALL = 1000
+# run_task starts at most 10 tasks per call
+TASKS_PER_CALL = 10
+STACK_TEMPLATE = json.dumps(
+    {"Resources": {"Topic": {"Type": "AWS::SNS::Topic"}}}
+)
+
+
+@dataclasses.dataclass
+class Seed:
+    stacks: int = 0
+    tables: int = 0
+    instances: int = 0
+    clusters: int = 0
+    tasks: int = 0
+    secrets: int = 0
+
+    @classmethod
+    def of_size(cls, size: int) -> "Seed":
+        """
+        The same number of every resource, with tasks spread
+        over one cluster per thousand tasks.
+        """
+        return cls(
+            stacks=size,
+            tables=size,
+            instances=size,
+            clusters=max(1, size // 1000),
+            tasks=size,
+            secrets=size,
+        )
+
+
+def run_all(call: Callable, items: Iterable):
+    # Moto backends are not thread safe, calls are sent one at a time
+    for item in items:
+        call(item)
+
+
+def seed_stacks(session: boto3.Session, count: int):
+    client = session.client("cloudformation")
+    run_all(
+        lambda i: client.create_stack(
+            StackName=f"stack-{i}", TemplateBody=STACK_TEMPLATE
+        ),
+        range(count),
+    )
+
+
+def seed_tables(session: boto3.Session, count: int):
+    client = session.client("dynamodb")
+    run_all(
+        lambda i: client.create_table(
+            TableName=f"table-{i}",
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "id", "AttributeType": "S"}
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        ),
+        range(count),
+    )
+
+
+def seed_instances(session: boto3.Session, count: int):
+    client = session.client("ec2")
+    image_id = client.describe_images(Owners=["amazon"])["Images"][0][
+        "ImageId"
+    ]
+    batches = [
+        min(INSTANCES_PER_CALL, count - start)
+        for start in range(0, count, INSTANCES_PER_CALL)
+    ]
+    run_all(
+        lambda batch: client.run_instances(
+            ImageId=image_id,
+            MinCount=batch,
+            MaxCount=batch,
+            InstanceType="t3.micro",
+            TagSpecifications=[
+                {
+                    "ResourceType": "instance",
+                    "Tags": [{"Key": "Name", "Value": "benchmark"}],
+                }
+            ],
+        ),
+        batches,
+    )
+
+
+def seed_clusters(session: boto3.Session, clusters: int, tasks: int):
+    client = session.client("ecs")
+    task_definition = client.register_task_definition(
+        family="benchmark",
+        requiresCompatibilities=["FARGATE"],
+        networkMode="awsvpc",
+        cpu="256",
+        memory="512",
+        containerDefinitions=[
+            {
+                "name": "app",
+                "image": "busybox",
+                "cpu": 256,
+                "memory": 512,
+                "essential": True,
+            }
+        ],
+    )["taskDefinition"]["taskDefinitionArn"]
+    cluster_names = [f"cluster-{i}" for i in range(clusters)]
+    run_all(
+        lambda name: client.create_cluster(clusterName=name), cluster_names
+    )
+    ec2 = session.client("ec2")
+    network = {
+        "subnets": [ec2.describe_subnets()["Subnets"][0]["SubnetId"]],
+        "securityGroups": [
+            ec2.describe_security_groups()["SecurityGroups"][0]["GroupId"]
+        ],
+    }
+    batches = [
+        (
+            cluster_names[(start // TASKS_PER_CALL) % clusters],
+            min(TASKS_PER_CALL, tasks - start),
+        )
+        for start in range(0, tasks, TASKS_PER_CALL)
+    ]
+    run_all(
+        lambda batch: client.run_task(
+            cluster=batch[0],
+            count=batch[1],
+            taskDefinition=task_definition,
+            launchType="FARGATE",
+            networkConfiguration={"awsvpcConfiguration": network},
+        ),
+        batches,
+    )
+
+
+def seed_secrets(session: boto3.Session, count: int):
+    client = session.client("secretsmanager")
+    run_all(
+        lambda i: client.create_secret(
+            Name=f"secret-{i}", SecretString=f"value-{i}"
+        ),
+        range(count),
+    )
+
+
+def seed(seed: Seed, region: str):
+    """
+    Creates the resources on the server AWS_ENDPOINT_URL points to.
+    """
+    session = boto3.Session(region_name=region)
+    seed_stacks(session, seed.stacks)
+    seed_tables(session, seed.tables)
+    seed_instances(session, seed.instances)
+    if seed.clusters:
+        seed_clusters(session, seed.clusters, seed.tasks)
+    seed_secrets(session, seed.secrets)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, required=True)
+    parser.add_argument("--region", required=True)
+    args = parser.parse_args()
+    seed(Seed.of_size(args.size), args.region)
@@ -0,0 +1,153 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import aws_slapdash.cli  # noqa: F401 puts the `utils` modules on sys.path
+from utils.aws import Config
+from utils.cache import ViewCache, remove_partial_entries
+from utils.filelock import fcntl
+
+
+def listing(titles):
+    for title in titles:
+        yield {"title": title}
+
+
+class ViewCacheTest(unittest.TestCase):
+    def setUp(self):
+        config_home = tempfile.TemporaryDirectory()
+        self.addCleanup(config_home.cleanup)
+        environ = mock.patch.dict(
+            os.environ, {"XDG_CONFIG_HOME": config_home.name}
+        )
+        environ.start()
+        self.addCleanup(environ.stop)
+        os.environ.pop("APPDATA", None)
+        self.cache = ViewCache(Config("dev", "eu-west-1", False), "ecs")
+
+    def store(self, titles, **kwargs):
+        return list(self.cache.store("clusters", listing(titles), **kwargs))
+
+    def titles(self):
+        entry = self.cache.load("clusters")
+        return None if entry is None else [o["title"] for o in entry.options()]
+
+    def test_store_and_load(self):
+        self.assertEqual(
+            self.store(["a", "b"]), [{"title": "a"}, {"title": "b"}]
+        )
+        self.assertEqual(self.titles(), ["a", "b"])
+
+    def test_interrupted_listing_keeps_the_previous_entry(self):
+        self.store(["a"])
+        options = self.cache.store("clusters", listing(["b", "c"]))
+        next(options)
+        options.close()
+        self.assertEqual(self.titles(), ["a"])
+        self.assertEqual(
+            os.listdir(self.cache.cache_dir),
+            [os.path.basename(self.cache.path("clusters"))],
+        )
+
+    def test_incomplete_listing_is_not_stored(self):
+        self.store(["a"], complete=lambda: False)
+        self.assertIsNone(self.titles())
+
+    def test_partial_entries_are_removed_at_exit(self):
+        options = self.cache.store("clusters", listing(["a", "b"]))
+        next(options)
+        self.assertTrue(
+            any(
+                name.endswith(".tmp")
+                for name in os.listdir(self.cache.cache_dir)
+            )
+        )
+        remove_partial_entries()
+        self.assertEqual(os.listdir(self.cache.cache_dir), [])
+
+    @unittest.skipIf(fcntl is None, "locking needs fcntl")
+    def test_waiter_gets_the_entry_the_fetch_stored(self):
+        fetching = threading.Event()
+        waited = []
+
+        def fetch():
+            with self.cache.single_flight("clusters", 5) as stored:
+                self.assertIsNone(stored)
+                fetching.set()
+                time.sleep(0.2)
+                self.store(["a"])
+
+        def wait():
+            fetching.wait()
+            with self.cache.single_flight("clusters", 5) as stored:
+                waited.append(stored)
+
+        threads = [
+            threading.Thread(target=fetch),
+            threading.Thread(target=wait),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([o["title"] for o in waited[0].options()], ["a"])
+
+    def test_older_entry_is_fetched_again(self):
+        self.store(["a"])
+        time.sleep(0.01)
+        with self.cache.single_flight("clusters", 1) as stored:
+            self.assertIsNone(stored)
+
+    @unittest.skipIf(fcntl is None, "locking needs fcntl")
+    def test_waiter_fetches_itself_after_the_timeout(self):
+        holding = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with self.cache.single_flight("clusters", 5):
+                holding.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        holding.wait()
+        started_at = time.monotonic()
+        with self.cache.single_flight("clusters", 0.2) as stored:
+            self.assertIsNone(stored)
+        self.assertLess(time.monotonic() - started_at, 2)
+        release.set()
+        holder.join()
+
+    @unittest.skipIf(fcntl is None, "locking needs fcntl")
+    def test_lock_of_a_killed_process_is_released(self):
+        lock_path = self.cache.path("clusters") + ".lock"
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        holder = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import fcntl, sys, time\n"
+                f"lock_file = open({lock_path!r}, 'a')\n"
+                "fcntl.flock(lock_file, fcntl.LOCK_EX)\n"
+                "print('locked', flush=True)\n"
+                "time.sleep(60)\n",
+            ],
+            stdout=subprocess.PIPE,
+        )
+        self.assertEqual(holder.stdout.readline(), b"locked\n")
+        holder.kill()
+        holder.wait()
+        holder.stdout.close()
+        started_at = time.monotonic()
+        with self.cache.single_flight("clusters", 5) as stored:
+            self.assertIsNone(stored)
+        self.assertLess(time.monotonic() - started_at, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from argparse import Namespace
+from unittest import mock
+
+import aws_slapdash.cli  # noqa: F401 puts the `utils` modules on sys.path
+from utils.aws import Config
+from utils.command import AWSServiceCommand
+from utils.deadline import DeadlineStream
+from utils.slapdash import (
+    SlapdashMessage,
+    slapdash_show_message_and_exit,
+    write_list_view,
+)
+
+
+class StubCommand(AWSServiceCommand):
+    service_id = "stub"
+
+    def service_name(self):
+        return "Stub"
+
+    def serve_command(self, arg_parser, argv, out):
+        pass
+
+    def service_url(self):
+        return ""
+
+
+def view_args(**kwargs) -> Namespace:
+    return Namespace(
+        **{
+            "argv": ["--service-name", "stub"],
+            "limit": None,
+            "query": None,
+            **kwargs,
+        }
+    )
+
+
+def titles(options):
+    return [option["title"] for option in options]
+
+
+def slow_listing(count, delay):
+    for i in range(count):
+        time.sleep(delay)
+        yield {"title": f"resource-{i}"}
+
+
+class RenderOptionsTest(unittest.TestCase):
+    def setUp(self):
+        config_home = tempfile.TemporaryDirectory()
+        self.addCleanup(config_home.cleanup)
+        environ = mock.patch.dict(
+            os.environ, {"XDG_CONFIG_HOME": config_home.name}
+        )
+        environ.start()
+        self.addCleanup(environ.stop)
+        os.environ.pop("APPDATA", None)
+        refresh = mock.patch("utils.command.spawn_background_refresh")
+        self.spawn_background_refresh = refresh.start()
+        self.addCleanup(refresh.stop)
+        self.command = StubCommand(
+            Config("dev", "eu-west-1", False, max_results=2)
+        )
+
+    def render(self, options, live=None, **kwargs):
+        return titles(
+            self.command.render_options(view_args(**kwargs), options, 0, live)
+        )
+
+    def test_every_option_without_a_query(self):
+        options = [{"title": f"table-{i}"} for i in range(5)]
+        self.assertEqual(
+            self.render(options),
+            ["Refresh (updated just now)"] + titles(options),
+        )
+
+    def test_query_caps_to_max_results(self):
+        options = [{"title": f"table-{i}"} for i in range(5)]
+        self.assertEqual(
+            self.render(options, query="table"),
+            [
+                "Refresh (updated just now)",
+                "table-0",
+                "table-1",
+                "Show more (2 of 5 shown)",
+            ],
+        )
+
+    def test_listing_cut_short_by_the_deadline(self):
+        live = DeadlineStream(slow_listing(10, 0.1), 0.25)
+        rendered = self.render(live, live)
+        self.assertEqual(rendered[1:-1], ["resource-0", "resource-1"])
+        self.assertEqual(
+            rendered[-1], "Results incomplete, loading more in the background"
+        )
+        self.spawn_background_refresh.assert_called_once_with(
+            ["--service-name", "stub"]
+        )
+
+    def test_complete_listing_is_not_refreshed(self):
+        live = DeadlineStream(slow_listing(2, 0), 5)
+        self.assertEqual(
+            self.render(live, live)[1:], ["resource-0", "resource-1"]
+        )
+        self.spawn_background_refresh.assert_not_called()
+
+
+class ListingErrorTest(unittest.TestCase):
+    def setUp(self):
+        self.command = StubCommand(Config("dev", "eu-west-1", False))
+
+    def test_message_before_any_option_is_a_message_view(self):
+        def unauthenticated():
+            slapdash_show_message_and_exit("could not authenticate")
+            yield {"title": "never listed"}
+
+        out = io.StringIO()
+        with self.assertRaisesRegex(SlapdashMessage, "authenticate"):
+            write_list_view(
+                self.command.render_options(view_args(), unauthenticated(), 0),
+                out,
+            )
+        # Nothing was written, the caller writes the message view instead
+        self.assertEqual(out.getvalue(), "")
+
+    def test_message_after_options_keeps_the_view_valid_json(self):
+        def throttled():
+            yield {"title": "table-0"}
+            slapdash_show_message_and_exit("throttled")
+
+        out = io.StringIO()
+        write_list_view(
+            self.command.render_options(view_args(), throttled(), 0), out
+        )
+        self.assertEqual(
+            titles(json.loads(out.getvalue())["view"]["options"]),
+            ["Refresh (updated just now)", "table-0", "throttled"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
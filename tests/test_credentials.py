@@ -0,0 +1,89 @@
+import tempfile
+import time
+import unittest
+
+import aws_slapdash.cli  # noqa: F401 puts the `utils` modules on sys.path
+from utils.credentials import (
+    DEFAULT_LIFETIME,
+    EXPIRY_MARGIN,
+    Credentials,
+    CredentialsCache,
+    parse_aws_vault_env,
+)
+
+AWS_VAULT_ENV = b"""HOME=/home/user
+AWS_VAULT=dev
+AWS_ACCESS_KEY_ID=ASIAEXAMPLE
+AWS_SECRET_ACCESS_KEY=secret=with=equals
+AWS_SESSION_TOKEN=token
+AWS_CREDENTIAL_EXPIRATION=2030-01-01T00:00:00Z
+"""
+
+
+def credentials(expires_in: float) -> Credentials:
+    return Credentials("key", "secret", "token", time.time() + expires_in)
+
+
+class ParseAwsVaultEnvTest(unittest.TestCase):
+    def test_parses_credentials_and_expiry(self):
+        parsed = parse_aws_vault_env(AWS_VAULT_ENV)
+        self.assertEqual(parsed.access_key_id, "ASIAEXAMPLE")
+        self.assertEqual(parsed.secret_access_key, "secret=with=equals")
+        self.assertEqual(parsed.session_token, "token")
+        self.assertEqual(parsed.expiration, 1893456000)
+
+    def test_session_expiration_is_used_as_fallback(self):
+        parsed = parse_aws_vault_env(
+            AWS_VAULT_ENV.replace(
+                b"AWS_CREDENTIAL_EXPIRATION", b"AWS_SESSION_EXPIRATION"
+            )
+        )
+        self.assertEqual(parsed.expiration, 1893456000)
+
+    def test_missing_expiry_assumes_a_short_lifetime(self):
+        env = b"\n".join(
+            line
+            for line in AWS_VAULT_ENV.split(b"\n")
+            if not line.startswith(b"AWS_CREDENTIAL_EXPIRATION")
+        )
+        parsed = parse_aws_vault_env(env)
+        self.assertAlmostEqual(
+            parsed.expiration, time.time() + DEFAULT_LIFETIME, delta=5
+        )
+
+    def test_incomplete_credentials(self):
+        self.assertIsNone(parse_aws_vault_env(b"AWS_ACCESS_KEY_ID=key\n"))
+        self.assertIsNone(parse_aws_vault_env(b"aws-vault: error\n"))
+
+
+class CredentialsCacheTest(unittest.TestCase):
+    def setUp(self):
+        config_path = tempfile.TemporaryDirectory()
+        self.addCleanup(config_path.cleanup)
+        self.cache = CredentialsCache(config_path.name)
+
+    def test_fresh_credentials_are_reused(self):
+        stored = credentials(3600)
+        self.cache.store("dev", stored)
+        self.assertEqual(self.cache.load("dev"), stored)
+        self.assertIsNone(self.cache.load("prod"))
+
+    def test_credentials_about_to_expire_are_not_used(self):
+        self.cache.store("dev", credentials(EXPIRY_MARGIN - 1))
+        self.assertIsNone(self.cache.load("dev"))
+
+    def test_store_drops_expired_profiles(self):
+        self.cache.store("dev", credentials(-1))
+        self.cache.store("prod", credentials(3600))
+        self.assertEqual(list(self.cache._read()), ["prod"])
+
+    def test_unreadable_file_is_ignored(self):
+        with open(self.cache.path, "w") as cache_file:
+            cache_file.write("{not json")
+        self.assertIsNone(self.cache.load("dev"))
+        self.cache.store("dev", credentials(3600))
+        self.assertIsNotNone(self.cache.load("dev"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import threading
+import time
+import unittest
+
+import aws_slapdash.cli  # noqa: F401 puts the `utils` modules on sys.path
+from utils.deadline import DeadlineStream
+
+
+def slow_listing(titles, delay, closed=None):
+    try:
+        for title in titles:
+            time.sleep(delay)
+            yield {"title": title}
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+class DeadlineStreamTest(unittest.TestCase):
+    def test_complete_within_the_deadline(self):
+        stream = DeadlineStream(slow_listing(["a", "b"], 0), 5)
+        self.assertEqual(list(stream), [{"title": "a"}, {"title": "b"}])
+        self.assertFalse(stream.expired)
+
+    def test_cut_short_at_the_deadline(self):
+        closed = threading.Event()
+        stream = DeadlineStream(
+            slow_listing(["a", "b", "c"], 0.2, closed), 0.3
+        )
+        started_at = time.monotonic()
+        self.assertEqual(list(stream), [{"title": "a"}])
+        self.assertLess(time.monotonic() - started_at, 0.4)
+        self.assertTrue(stream.expired)
+        # The producer stops after its current item and closes the listing
+        self.assertTrue(closed.wait(2))
+
+    def test_errors_reach_the_consumer(self):
+        def failing():
+            yield {"title": "a"}
+            raise ValueError("throttled")
+
+        stream = DeadlineStream(failing(), 5)
+        with self.assertRaisesRegex(ValueError, "throttled"):
+            list(stream)
+        self.assertFalse(stream.expired)
+
+
+if __name__ == "__main__":
+    unittest.main()
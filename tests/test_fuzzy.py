@@ -0,0 +1,58 @@
+import unittest
+
+from aws_slapdash.utils.fuzzy import NO_MATCH, rank, score
+
+
+def ranked(query, titles, limit=10, **kwargs):
+    options = [{"title": title} for title in titles]
+    return [
+        option["title"] for option in rank(options, query, limit, **kwargs)
+    ]
+
+
+class ScoreTest(unittest.TestCase):
+    def test_match_kinds(self):
+        self.assertGreater(score("sec", "secret"), score("cre", "secret"))
+        self.assertGreater(score("cre", "secret"), score("scr", "secret"))
+        self.assertEqual(score("xyz", "secret"), NO_MATCH)
+
+    def test_shorter_key_wins_equal_matches(self):
+        self.assertGreater(
+            score("cret-1", "secret-1"), score("cret-1", "secret-10")
+        )
+        self.assertGreater(
+            score("cret-1", "secret-10"), score("cret-1", "secret-1000000")
+        )
+
+    def test_earlier_match_wins(self):
+        self.assertGreater(score("prod", "a-prod"), score("prod", "abc-prod"))
+
+
+class RankTest(unittest.TestCase):
+    def test_exact_match_first(self):
+        titles = [f"secret-1{i}" for i in range(5)] + ["secret-1"]
+        self.assertEqual(ranked("secret-1", titles)[0], "secret-1")
+        self.assertEqual(ranked("cret-1", titles)[0], "secret-1")
+
+    def test_ranks_by_key(self):
+        titles = ["dev/eu-west-1 | table-10", "prod/eu-west-1 | table-1"]
+        self.assertEqual(
+            ranked(
+                "table-1",
+                titles,
+                key=lambda option: option["title"].split(" | ", 1)[-1],
+            ),
+            ["prod/eu-west-1 | table-1", "dev/eu-west-1 | table-10"],
+        )
+
+    def test_keeps_order_without_query(self):
+        self.assertEqual(ranked("", ["b", "a", "c"], limit=2), ["b", "a"])
+
+    def test_no_limit_keeps_every_option(self):
+        titles = [f"table-{i}" for i in range(300)]
+        self.assertEqual(ranked("", titles, limit=None), titles)
+        self.assertEqual(len(ranked("table", titles, limit=None)), 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
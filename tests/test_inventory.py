@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+import aws_slapdash.cli  # noqa: F401 puts the `utils` modules on sys.path
+from utils.inventory import TAGGING_SOURCE, InventoryIndex
+
+SCOPE = "dev/eu-west-1"
+
+
+def options(*titles, **fields):
+    return [{"title": title, **fields} for title in titles]
+
+
+class InventoryIndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = InventoryIndex(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.index.close)
+
+    def indexed(self, service_id="ecs", scope=SCOPE):
+        return sorted(
+            self.index.connection.execute(
+                "SELECT title, source FROM resources "
+                "WHERE scope = ? AND service = ?",
+                (scope, service_id),
+            )
+        )
+
+    def test_listing_replaces_its_previous_rows(self):
+        self.index.replace(SCOPE, "ecs", options("orders", "payments"))
+        self.index.replace(SCOPE, "ecs", options("orders"))
+        self.assertEqual(self.indexed(), [("orders", "listing")])
+
+    def test_tagging_sync_keeps_listed_rows(self):
+        self.index.replace(SCOPE, "ecs", options("orders"))
+        self.index.replace(
+            SCOPE, "ecs", options("orders", "billing"), TAGGING_SOURCE
+        )
+        self.index.replace(SCOPE, "ecs", options("billing"), TAGGING_SOURCE)
+        self.assertEqual(
+            self.indexed(), [("billing", "tagging"), ("orders", "listing")]
+        )
+
+    def test_listing_takes_over_tagged_titles(self):
+        self.index.replace(
+            SCOPE, "ecs", options("orders", "billing"), TAGGING_SOURCE
+        )
+        self.index.replace(SCOPE, "ecs", options("orders", subtitle="listed"))
+        self.assertEqual(
+            self.indexed(), [("billing", "tagging"), ("orders", "listing")]
+        )
+        self.assertEqual(
+            self.index.search(SCOPE, "orders"),
+            [("ecs", {"title": "orders", "subtitle": "listed"})],
+        )
+
+    def test_other_services_and_scopes_are_untouched(self):
+        self.index.replace(SCOPE, "ecs", options("orders"))
+        self.index.replace(SCOPE, "dynamodb", options("orders-table"))
+        self.index.replace("prod/eu-west-1", "ecs", options("orders"))
+        self.index.replace(SCOPE, "ecs", [])
+        self.assertEqual(self.indexed(), [])
+        self.assertEqual(
+            self.indexed("dynamodb"), [("orders-table", "listing")]
+        )
+        self.assertEqual(
+            self.indexed(scope="prod/eu-west-1"), [("orders", "listing")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
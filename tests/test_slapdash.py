@@ -0,0 +1,46 @@
+import io
+import json
+import unittest
+
+import aws_slapdash.cli  # noqa: F401 puts the `utils` modules on sys.path
+from utils.slapdash import SlapdashMessage, write_list_view
+
+
+def listing(titles, error=None):
+    for title in titles:
+        yield {"title": title}
+    if error is not None:
+        raise SlapdashMessage(error)
+
+
+class WriteListViewTest(unittest.TestCase):
+    def test_writes_options(self):
+        out = io.StringIO()
+        write_list_view(listing(["a", "b"]), out)
+        self.assertEqual(
+            json.loads(out.getvalue()),
+            {
+                "view": {
+                    "type": "list",
+                    "options": [{"title": "a"}, {"title": "b"}],
+                }
+            },
+        )
+
+    def test_message_before_first_option_writes_nothing(self):
+        out = io.StringIO()
+        with self.assertRaises(SlapdashMessage):
+            write_list_view(listing([], "could not authenticate"), out)
+        self.assertEqual(out.getvalue(), "")
+
+    def test_message_after_options_ends_the_list(self):
+        out = io.StringIO()
+        write_list_view(listing(["a"], "throttled"), out)
+        options = json.loads(out.getvalue())["view"]["options"]
+        self.assertEqual(
+            [option["title"] for option in options], ["a", "throttled"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import tempfile
+import threading
+import time
+import unittest
+
+import aws_slapdash.cli  # noqa: F401 puts the `utils` modules on sys.path
+from utils.trace import current, in_current_context, invocation, span
+
+
+class TraceContextTest(unittest.TestCase):
+    def setUp(self):
+        self.config_path = tempfile.mkdtemp()
+
+    def test_worker_threads_record_to_the_caller_trace(self):
+        with invocation(self.config_path, ["--service-name", "ecs"]) as trace:
+            worker = threading.Thread(
+                target=in_current_context(
+                    lambda: current().record("page", time.perf_counter(), 0)
+                )
+            )
+            worker.start()
+            worker.join()
+        self.assertIn("page", [recorded["name"] for recorded in trace.spans])
+        self.assertIsNone(current())
+
+    def test_concurrent_invocations_keep_their_spans(self):
+        traces = {}
+        both_started = threading.Barrier(2)
+
+        def serve(service):
+            argv = ["--service-name", service]
+            with invocation(self.config_path, argv) as trace:
+                both_started.wait()
+                with span("list", service=service):
+                    pass
+            traces[service] = trace
+
+        workers = [
+            threading.Thread(target=serve, args=(service,))
+            for service in ["ecs", "dynamodb"]
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        for service, trace in traces.items():
+            self.assertEqual(
+                [
+                    recorded["service"]
+                    for recorded in trace.spans
+                    if recorded["name"] == "list"
+                ],
+                [service],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()